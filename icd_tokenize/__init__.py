@@ -1,10 +1,16 @@
-from .data import Data
-from .icd import ICD
-from .record import Record
-from .stats import Stats
-from .synonym import Synonym
-from .tokenizer import Tokenizer
-from .validator import Validator
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .combination import Combination
+    from .data import Data
+    from .icd import ICD
+    from .record import Record
+    from .stats import Stats
+    from .synonym import Synonym
+    from .tokenizer import Tokenizer
+    from .validator import Validator
+    from .watcher import Watcher
 
 __all__ = [
     "ICD",
@@ -14,4 +20,32 @@ __all__ = [
     "Stats",
     "Data",
     "Synonym",
+    "Combination",
+    "Watcher",
 ]
+
+# Modules are imported on first attribute access, so that importing the package only loads what
+# is actually used
+_modules = {
+    "ICD": ".icd",
+    "Tokenizer": ".tokenizer",
+    "Validator": ".validator",
+    "Record": ".record",
+    "Stats": ".stats",
+    "Data": ".data",
+    "Synonym": ".synonym",
+    "Combination": ".combination",
+    "Watcher": ".watcher",
+}
+
+
+def __getattr__(name: str):
+    if name not in _modules:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_modules[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
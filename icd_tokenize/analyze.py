@@ -1,48 +1,111 @@
 """
-This script is used to analyze the dataset. Output the most frequent 50 labels.
+This script is used to analyze the error result of a run. Output the most frequent 50 labels
+which are missing from the inputs, in total, by catalog and by month.
 """
+
+import argparse
 import ast
+import csv
+import json
 import os
 import time
+from collections import Counter
+from typing import Iterator
 
 import pandas as pd
 from rich.console import Console
 
-# Create rich console
-console = Console()
-
-# Start process timing
-start_time = time.time()
-console.print(":rocket: start processing")
-
-data_dir = "tmp"
-data_dir = os.path.join(data_dir, os.listdir(data_dir)[-1])
-data_dir = [os.path.join(data_dir, f) for f in os.listdir(data_dir)]
-data_dir = list(filter(os.path.isdir, data_dir))
-files = []
-for d in data_dir:
-    for f in os.listdir(d):
-        files.append(os.path.join(d, f))
-
-targets_list = []
-for file in files:
-    # Load Dataset
-    df = pd.read_csv(file)
-    for _, row in df.iterrows():
-        inputs = ast.literal_eval(row["inputs"])
-        targets = ast.literal_eval(row["targets"])
-        for target in targets:
-            if targets not in inputs:
-                targets_list.append(target)
-
-labels_count = pd.Series(targets_list).value_counts()
-labels_count = labels_count.sort_values(ascending=False)
-most_labels = labels_count.head(50)
-print(most_labels)
-
-# Finish process timing
-end_time = time.time()
-elapsed_time = end_time - start_time
-
-# Print final result
-console.print(f":hourglass: elapsed time:\t[green bold]{round(elapsed_time, 3)}s[/]")
+from icd_tokenize.data import Data
+
+
+def latest_run(tmp_dir: str = "tmp") -> str:
+    """Return the directory of the latest run, whose name is the timestamp of the run"""
+    runs = [d for d in os.listdir(tmp_dir) if os.path.isdir(os.path.join(tmp_dir, d))]
+    return os.path.join(tmp_dir, max(runs))
+
+
+def iter_errors(run_dir: str) -> Iterator[tuple[str, dict]]:
+    """Yield the month and each error row of a run, one row at a time"""
+    for month in sorted(os.listdir(run_dir)):
+        for row in iter_month_errors(run_dir, month):
+            yield month, row
+
+
+def iter_month_errors(run_dir: str, month: str) -> Iterator[dict]:
+    """Yield each error row of a month of a run, one row at a time.
+
+    Rows are read from the json lines written by main.py, or from the csv of older runs.
+    """
+    path = os.path.join(run_dir, month, month)
+    if os.path.exists(f"{path}.jsonl"):
+        with open(f"{path}.jsonl", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+    elif os.path.exists(f"{path}.csv"):
+        with open(f"{path}.csv", newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                row["serial"] = int(row["serial"])
+                for col in ["inputs", "results", "targets"]:
+                    row[col] = ast.literal_eval(row[col])
+                yield row
+
+
+def read_errors(run_dir: str) -> dict[str, list[dict]]:
+    """Return the error rows of each month of a run"""
+    errors = {}
+    for month, row in iter_errors(run_dir):
+        errors.setdefault(month, []).append(row)
+    return errors
+
+
+def missing_targets(errors: dict[str, list[dict]]) -> pd.DataFrame:
+    """Return the month, catalog and label of each target which is not in the inputs"""
+    rows = [
+        (month, row["catalog"], target)
+        for month, rows in errors.items()
+        for row in rows
+        for target in row["targets"]
+        if target not in row["inputs"]
+    ]
+    df = pd.DataFrame(rows, columns=["month", "catalog", "label"])
+    df["catalog"] = pd.Categorical(df["catalog"], categories=Data.KEYS)
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--top", help="number of labels to show", type=int, default=50)
+    parser.add_argument("run", help="run directory, the latest run in tmp by default", nargs="?")
+    args = parser.parse_args()
+
+    # Create rich console
+    console = Console()
+
+    # Start process timing
+    start_time = time.time()
+    console.print(":rocket: start processing")
+
+    run_dir = args.run or latest_run()
+    console.print(f":open_file_folder: analyze directory: [yellow]{os.path.abspath(run_dir)}[/]")
+    df = missing_targets(read_errors(run_dir))
+
+    # Most frequent labels in total
+    labels_count = pd.Series(Counter(df["label"]), dtype=int).sort_values(ascending=False)
+    print(labels_count.head(args.top))
+
+    # Most frequent labels of each catalog
+    catalog_count = df.groupby(["catalog", "label"], observed=True).size()
+    for catalog, count in catalog_count.groupby(level="catalog", observed=True):
+        console.print(f"\n[bold]{catalog}[/]")
+        print(count.droplevel("catalog").sort_values(ascending=False).head(args.top))
+
+    # Number of missing labels of each month and catalog
+    console.print("\n[bold]month x catalog[/]")
+    print(pd.crosstab(df["month"], df["catalog"], margins=True, margins_name="total"))
+
+    # Finish process timing
+    end_time = time.time()
+    elapsed_time = end_time - start_time
+
+    # Print final result
+    console.print(f":hourglass: elapsed time:\t[green bold]{round(elapsed_time, 3)}s[/]")
@@ -0,0 +1,91 @@
+"""
+This script is used to benchmark startup time. Each run starts a fresh interpreter, which imports
+the package, builds a tokenizer and extracts a single diagnosis.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from rich.console import Console
+from rich.table import Table
+
+# Modules which the core tokenize and validate path should not import
+HEAVY_MODULES = ["pandas", "numpy", "rich"]
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from icd_tokenize import Tokenizer, Validator
+imported = time.perf_counter()
+tokenizer = Tokenizer()
+validator = Validator()
+initialized = time.perf_counter()
+tokenizer.extract("高血壓心臟病")
+extracted = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "initialize": initialized - imported,
+    "extract": extracted - initialized,
+    "modules": [m for m in %r if m in sys.modules],
+}))
+"""
+
+
+def run() -> tuple[dict, list[tuple[int, str]]]:
+    """Return timings of a fresh interpreter and the self import time of each module"""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT % HEAVY_MODULES],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Lines of -X importtime are "import time: self [us] | cumulative | imported package"
+    modules = []
+    for line in process.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[0].split(":")[-1].strip().isdigit():
+            modules.append((int(fields[0].split(":")[-1]), fields[2].strip()))
+    return json.loads(process.stdout), modules
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark startup time of icd_tokenize")
+    parser.add_argument("-n", "--runs", help="number of runs", type=int, default=5)
+    args = parser.parse_args()
+
+    results = [run() for _ in range(args.runs)]
+    timings = [timing for timing, _ in results]
+
+    table = Table(title="Startup")
+    table.add_column("Stage", justify="center")
+    table.add_column("Median", justify="center")
+    table.add_column("Max", justify="center")
+    for stage, key in [
+        ("import", "import"),
+        ("initialize", "initialize"),
+        ("first extract", "extract"),
+    ]:
+        values = [t[key] for t in timings]
+        table.add_row(
+            stage,
+            f"{round(statistics.median(values) * 1000, 1)}ms",
+            f"{round(max(values) * 1000, 1)}ms",
+        )
+
+    # Slowest modules of the last run
+    slowest = Table(title="Slowest Imports")
+    slowest.add_column("Module", justify="center")
+    slowest.add_column("Self", justify="center")
+    for self_us, module in sorted(results[-1][1], reverse=True)[:10]:
+        slowest.add_row(module, f"{round(self_us / 1000, 1)}ms")
+
+    console = Console()
+    console.print(table)
+    console.print(slowest)
+    modules = sorted({m for t in timings for m in t["modules"]})
+    if modules:
+        console.print(f":warning: heavy modules imported: [red bold]{', '.join(modules)}[/]")
+    else:
+        console.print(f":white_check_mark: no heavy modules imported ({', '.join(HEAVY_MODULES)})")
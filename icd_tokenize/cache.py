@@ -0,0 +1,92 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+@dataclass
+class CacheInfo:
+    """Store hit-rate statistics of a cache"""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+    maxsize: int = None
+
+    @property
+    def lookups(self):
+        """Return the number of lookups"""
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self):
+        """Return the rate of lookups served from the cache"""
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def __add__(self, other: "CacheInfo") -> "CacheInfo":
+        """Return the sum of statistics of two caches, such as the caches of two workers"""
+        return CacheInfo(
+            hits=self.hits + other.hits,
+            misses=self.misses + other.misses,
+            evictions=self.evictions + other.evictions,
+            size=self.size + other.size,
+            maxsize=self.maxsize,
+        )
+
+
+class LRUCache:
+    """Thread-safe least recently used cache.
+
+    ``maxsize`` of None makes the cache unbounded. Entries are not pickled, so a cache sent to a
+    worker process starts empty there instead of shipping the parent's entries.
+    """
+
+    def __init__(self, maxsize: int = None) -> None:
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getstate__(self):
+        return {"maxsize": self.maxsize}
+
+    def __setstate__(self, state):
+        self.__init__(state["maxsize"])
+
+    def get(self, key, default=None):
+        """Return the value of key and mark it as recently used, default if key is missing"""
+        with self.lock:
+            try:
+                value = self.data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value) -> None:
+        """Insert value of key, evicting the least recently used entries beyond maxsize"""
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            if self.maxsize is not None:
+                while len(self.data) > self.maxsize:
+                    self.data.popitem(last=False)
+                    self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove all entries and reset statistics"""
+        with self.lock:
+            self.data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self) -> CacheInfo:
+        """Return statistics of the cache"""
+        with self.lock:
+            return CacheInfo(self.hits, self.misses, self.evictions, len(self.data), self.maxsize)
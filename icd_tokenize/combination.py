@@ -0,0 +1,38 @@
+import csv
+import os
+
+
+class Combination:
+    def __init__(self, dir_path: str = None) -> None:
+        """Initialize combination rules indexed by component and by combined form."""
+        if dir_path is None:
+            dir_path = os.path.join(os.path.dirname(__file__), "data")
+
+        self.by_first = {}  # first -> [(second, combined)]
+        self.by_second = {}  # second -> [(first, combined)]
+        self.by_combined = {}  # combined -> [(first, second)]
+
+        combination_file = os.path.join(dir_path, "combination.csv")
+        with open(combination_file, newline="", encoding="utf-8") as f:
+            rows = [(row["first"], row["second"], row["combined"]) for row in csv.DictReader(f)]
+        for first, second, combined in rows:
+            self.by_first.setdefault(first, []).append((second, combined))
+            self.by_second.setdefault(second, []).append((first, combined))
+            self.by_combined.setdefault(combined, []).append((first, second))
+
+    def match(self, diagnosis: str, siblings: set, others: set) -> bool:
+        """Return True if a combination rule explains diagnosis.
+
+        Either diagnosis and another component in siblings combine into a diagnosis of others,
+        or diagnosis is a combined form whose components are both in others.
+        """
+        for second, combined in self.by_first.get(diagnosis, ()):
+            if second in siblings and combined in others:
+                return True
+        for first, combined in self.by_second.get(diagnosis, ()):
+            if first in siblings and combined in others:
+                return True
+        for first, second in self.by_combined.get(diagnosis, ()):
+            if first in others and second in others:
+                return True
+        return False
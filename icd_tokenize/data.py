@@ -1,12 +1,59 @@
-class Data(dict):
+class Data:
+    """Values of each catalog, stored in slots instead of a dict"""
+
     KEYS = ["甲", "乙", "丙", "丁", "其他"]
     CODES = ["CA", "CB", "CC", "CD", "CE"]
     TAGS = ["", "2", "3", "4"]
 
-    def __init__(self):
-        super().__init__()
-        self["甲"] = []
-        self["乙"] = []
-        self["丙"] = []
-        self["丁"] = []
-        self["其他"] = []
+    __slots__ = ("甲", "乙", "丙", "丁", "其他")
+
+    def __init__(self, values=None):
+        if values is None:
+            values = [[] for _ in self.KEYS]
+        for key, value in zip(self.KEYS, values):
+            setattr(self, key, value)
+
+    def __getitem__(self, key: str):
+        if key not in Data.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value) -> None:
+        if key not in Data.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key) -> bool:
+        return key in Data.__slots__
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self) -> int:
+        return len(self.KEYS)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (Data, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+    def __getstate__(self):
+        return tuple(self.values())
+
+    def __setstate__(self, state) -> None:
+        self.__init__(state)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in Data.__slots__ else default
+
+    def keys(self) -> list[str]:
+        return list(self.KEYS)
+
+    def values(self) -> list:
+        return [getattr(self, key) for key in self.KEYS]
+
+    def items(self) -> list[tuple]:
+        return [(key, getattr(self, key)) for key in self.KEYS]
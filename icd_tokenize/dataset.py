@@ -1,12 +1,17 @@
 """
 This script is used to generate dataset from excel files.
 """
+import argparse
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import pandas as pd
 import pyarrow
-from datasets import ClassLabel, Dataset, Features, Sequence, Value
+from datasets import ClassLabel, Dataset, DatasetInfo, Features, Sequence, Value
+
+from icd_tokenize.data import Data
+from icd_tokenize.workbook import INPUT_COLUMNS, TARGET_COLUMNS, Workbook
 
 pyarrow.PyExtensionType.set_auto_load(True)
 
@@ -14,57 +19,9 @@ pyarrow.PyExtensionType.set_auto_load(True)
 icd_df = pd.read_csv("icd_tokenize/data/original-icd.csv")
 icd_dict = dict(zip(icd_df["diagnosis"], icd_df["ICD1"]))
 icd_set = set(icd_dict.values())
-class_labels = ClassLabel(num_classes=len(icd_set), names=list(icd_set))
-
-
-def generate_data():
-    data_dir = "data"
-    files = os.listdir(data_dir)
-    files = filter(lambda f: f[:2] != "~$", files)  # Prevent processing temporary excel files
-    files = list(filter(lambda f: "(00000)" not in f, files))
-
-    for file in files:
-        year_month = file[file.find("(") + 1 : file.find(")")]
-        year = int(year_month[:3])
-        month = int(year_month[3:])
-
-        # Load Dataset
-        df = pd.read_excel(os.path.join(data_dir, file), header=1)
-        df[["NO", "死亡方式", "創傷代號", "創傷代號.1", "創傷代號\n檢查", "流水號"]] = df[
-            ["NO", "死亡方式", "創傷代號", "創傷代號.1", "創傷代號\n檢查", "流水號"]
-        ].fillna(0)
-        df = df.replace(np.nan, "", regex=True)  # replace nan with empty string
-
-        for _, row in df.iterrows():
-            for i, catalog in enumerate(["甲", "乙", "丙", "丁", "其他"]):
-                input_data = []
-                target_data = []
-
-                for tag in ["", "2", "3", "4"]:
-                    input_data.append(row[f"{catalog}{tag}"])
-                    target_data.append(row[f"{catalog}{tag}.1"])
-
-                input_data = list(filter(lambda x: x != "", input_data))
-                target_data = list(filter(lambda x: x != "", target_data))
-                icd_data = [icd_dict.get(icd, "R97") for icd in target_data]
-                class_data = [class_labels.str2int(icd) for icd in icd_data]
-
-                yield {
-                    "year": year + 1911,
-                    "month": month,
-                    "no": row["NO"],
-                    "death": row["死亡方式"],
-                    "input_code": row["創傷代號"],
-                    "result_code": row["創傷代號.1"],
-                    "check": row["創傷代號\n檢查"],
-                    "serial_no": row["流水號"],
-                    "catalog": i,
-                    "inputs": input_data,
-                    "results": target_data,
-                    "icds": icd_data,
-                    "encodes": class_data,
-                }
-
+# Sorted, so that every process and every run encodes the same label with the same integer
+class_labels = ClassLabel(num_classes=len(icd_set), names=sorted(icd_set))
+label_dict = {name: i for i, name in enumerate(class_labels.names)}
 
 features = Features(
     {
@@ -84,5 +41,89 @@ features = Features(
     }
 )
 
-dataset = Dataset.from_generator(generate_data, features=features)
-dataset.push_to_hub("eddielin0926/chinese-icd")
+
+def list_files(data_dir: str) -> list[str]:
+    files = os.listdir(data_dir)
+    files = filter(lambda f: f[:2] != "~$", files)  # Prevent processing temporary excel files
+    files = filter(lambda f: "(00000)" not in f, files)
+    return [os.path.join(data_dir, file) for file in sorted(files)]
+
+
+def to_lists(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return the non-empty values of each row of values, and the list offsets of the rows"""
+    mask = values != ""
+    offsets = np.zeros(len(values) + 1, dtype=np.int32)
+    np.cumsum(mask.sum(axis=1), out=offsets[1:])
+    return values[mask], offsets
+
+
+def read_table(path: str) -> pyarrow.Table:
+    """Return the rows of each catalog of a workbook, in the schema of features"""
+    file = os.path.basename(path)
+    year_month = file[file.find("(") + 1 : file.find(")")]
+    year = int(year_month[:3])
+    month = int(year_month[3:])
+
+    # Load Dataset
+    df = Workbook(path).read()
+    columns = ["NO", "死亡方式", "創傷代號", "創傷代號.1", "創傷代號\n檢查", "流水號"]
+    df[columns] = df[columns].fillna(0)
+
+    # One row for each catalog of each row, with the four tags of the catalog as a list
+    size = len(df) * len(Data.KEYS)
+    tags = len(Data.TAGS)
+    inputs, input_offsets = to_lists(df.iloc[:, INPUT_COLUMNS].to_numpy(str).reshape(size, tags))
+    results, offsets = to_lists(df.iloc[:, TARGET_COLUMNS].to_numpy(str).reshape(size, tags))
+    icds = pd.Series(results).map(icd_dict).fillna("R97")
+    encodes = icds.map(label_dict)
+
+    def repeat(column: str, dtype) -> np.ndarray:
+        return np.repeat(df[column].to_numpy(dtype), len(Data.KEYS))
+
+    return pyarrow.table(
+        {
+            "year": np.full(size, year + 1911, dtype=np.int32),
+            "month": np.full(size, month, dtype=np.int32),
+            "no": repeat("NO", np.int32),
+            "death": repeat("死亡方式", np.int32),
+            "input_code": repeat("創傷代號", np.int32),
+            "result_code": repeat("創傷代號.1", np.int32),
+            "check": repeat("創傷代號\n檢查", bool),
+            "serial_no": repeat("流水號", np.int32),
+            "catalog": np.tile(np.arange(len(Data.KEYS), dtype=np.int32), len(df)),
+            "inputs": pyarrow.ListArray.from_arrays(input_offsets, inputs),
+            "results": pyarrow.ListArray.from_arrays(offsets, results),
+            "icds": pyarrow.ListArray.from_arrays(offsets, icds.to_numpy(str)),
+            "encodes": pyarrow.ListArray.from_arrays(offsets, encodes.to_numpy(np.int64)),
+        }
+    ).cast(features.arrow_schema)
+
+
+def generate_dataset(data_dir: str = "data", workers: int = None) -> Dataset:
+    """Return the dataset of all workbooks in data_dir, read by workers processes"""
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        tables = list(executor.map(read_table, list_files(data_dir)))
+    return Dataset(pyarrow.concat_tables(tables), info=DatasetInfo(features=features))
+
+
+if __name__ == "__main__":
+    from rich.console import Console
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output", help="output directory", default="dataset")
+    parser.add_argument("-w", "--workers", help="number of processes", type=int)
+    parser.add_argument("-s", "--shards", help="number of shards to write", type=int)
+    parser.add_argument(
+        "--push",
+        help="push to the hub instead of saving to the output directory",
+        action="store_true",
+    )
+    parser.add_argument("data", help="data directory", nargs="?", default="data")
+    args = parser.parse_args()
+
+    dataset = generate_dataset(args.data, args.workers)
+    if args.push:
+        dataset.push_to_hub("eddielin0926/chinese-icd")
+    else:
+        dataset.save_to_disk(args.output, num_shards=args.shards, num_proc=args.workers)
+        Console().print(f"Write into directory:\t [cyan bold]{args.output}[/]")
@@ -0,0 +1,198 @@
+"""
+This script is used to compare two runs. Output the records which are newly broken, newly fixed
+or changed from the old run to the new run, and the difference of the result of each file.
+"""
+
+import argparse
+import csv
+import os
+import time
+from collections import Counter
+from typing import Iterator, Optional
+
+import pyarrow.parquet as pq
+from rich.console import Console
+from rich.table import Table
+
+from icd_tokenize.analyze import iter_month_errors
+from icd_tokenize.stats import Stats
+from icd_tokenize.writer import CsvWriter
+
+# Columns of diff result
+DIFF_FIELDS = ["status", "month", "serial", "catalog", "inputs", "old", "new", "targets"]
+STATUSES = ["broken", "fixed", "changed"]
+
+
+def list_runs(tmp_dir: str = "tmp") -> list[str]:
+    """Return the directories of runs from the oldest to the latest"""
+    runs = [d for d in os.listdir(tmp_dir) if os.path.isdir(os.path.join(tmp_dir, d))]
+    return [os.path.join(tmp_dir, d) for d in sorted(runs)]
+
+
+def read_stats(run_dir: str) -> dict[str, Stats]:
+    """Return the stats of each file and of the total in result.csv of a run"""
+    stats = {}
+    with open(os.path.join(run_dir, "result.csv"), newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            counts = [int(row[col]) for col in ["identical", "correct", "total", "dirty"]]
+            stats[row["name"]] = Stats(row["name"], *counts)
+    return stats
+
+
+def read_results(run_dir: str, month: str) -> Optional[dict[tuple, dict]]:
+    """Return the row of each (流水號, catalog) of a month of a run, correct or not.
+
+    Rows are read from the parquet written by main.py -p, None if the run has no parquet.
+    """
+    path = os.path.join(run_dir, month, f"{month}.parquet")
+    if not os.path.exists(path):
+        return None
+    columns = ["serial", "catalog", "inputs", "results", "targets"]
+    rows = pq.read_table(path, columns=columns).to_pylist()
+    return {(row["serial"], row["catalog"]): row for row in rows}
+
+
+def results_of(rows: Optional[dict[tuple, dict]], key: tuple) -> Optional[list]:
+    """Return the results of key in rows from read_results, None if they are unknown"""
+    row = rows.get(key) if rows is not None else None
+    return row["results"] if row is not None else None
+
+
+def diff_row(status: str, month: str, row: dict, old: list, new: list) -> dict:
+    return {
+        "status": status,
+        "month": month,
+        "serial": row["serial"],
+        "catalog": row["catalog"],
+        "inputs": row["inputs"],
+        "old": old,
+        "new": new,
+        "targets": row["targets"],
+    }
+
+
+def diff_errors(old_dir: str, new_dir: str) -> Iterator[dict]:
+    """Yield the rows which are broken, fixed or changed from the old run to the new run.
+
+    Only months in the result of both runs are compared, one month at a time. Errors of the old
+    run are indexed by (流水號, catalog), and errors of the new run are streamed against the
+    index.
+
+    The results of correct rows are only kept in the parquet written by main.py -p. Without it,
+    the old results of broken rows and the new results of fixed rows are left blank, and changed
+    rows are only the ones which are errors in both runs. With the parquet of both runs, rows
+    which are correct in both runs but whose results changed are reported as changed too.
+    """
+    months = read_stats(old_dir).keys() & read_stats(new_dir).keys()
+    for month in sorted(months):
+        old_results = read_results(old_dir, month)
+        new_results = read_results(new_dir, month)
+        old = {(row["serial"], row["catalog"]): row for row in iter_month_errors(old_dir, month)}
+        errors = set(old)
+
+        for row in iter_month_errors(new_dir, month):
+            key = (row["serial"], row["catalog"])
+            errors.add(key)
+            previous = old.pop(key, None)
+            if previous is None:
+                yield diff_row("broken", month, row, results_of(old_results, key), row["results"])
+            elif previous["results"] != row["results"]:
+                yield diff_row("changed", month, row, previous["results"], row["results"])
+
+        # Errors left in the old run are correct in the new run
+        for key, row in old.items():
+            yield diff_row("fixed", month, row, row["results"], results_of(new_results, key))
+
+        # Rows which are correct in both runs
+        if old_results is None or new_results is None:
+            continue
+        for key, row in new_results.items():
+            results = results_of(old_results, key)
+            if key not in errors and results is not None and results != row["results"]:
+                yield diff_row("changed", month, row, results, row["results"])
+
+
+def delta(old: float, new: float, percent: bool = False) -> str:
+    if percent:
+        return f"{round(new * 100, 2)}% ({(new - old) * 100:+.2f})"
+    return f"{new} ({new - old:+})"
+
+
+def stats_table(old_stats: dict[str, Stats], new_stats: dict[str, Stats]) -> Table:
+    """Return the table of the stats of the new run, with their differences to the old run"""
+    table = Table(title="Result")
+    for column in ["File", "Identical", "Correct", "Total", "Identical Rate", "Correct Rate"]:
+        table.add_column(column, justify="center")
+    table.add_column("Dirty", justify="center")
+    names = sorted(old_stats.keys() & new_stats.keys() - {"total"})
+    for name in names + ["total"]:
+        if name == "total":
+            table.add_section()
+        old, new = old_stats[name], new_stats[name]
+        table.add_row(
+            name,
+            delta(old.identical, new.identical),
+            delta(old.correct, new.correct),
+            delta(old.total, new.total),
+            delta(old.identical_rate, new.identical_rate, percent=True),
+            delta(old.correct_rate, new.correct_rate, percent=True),
+            delta(old.dirty, new.dirty),
+        )
+    return table
+
+
+def diff_table(counts: Counter) -> Table:
+    """Return the table of the number of rows of each status in each month"""
+    table = Table(title="Diff", show_footer=True)
+    table.add_column("Month", footer="Total", justify="center")
+    for status in STATUSES:
+        total = sum(count for (_, s), count in counts.items() if s == status)
+        table.add_column(status.capitalize(), footer=str(total), justify="center")
+    for month in sorted({month for month, _ in counts}):
+        table.add_row(month, *[str(counts[month, status]) for status in STATUSES])
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output", help="output csv file of the differences")
+    parser.add_argument(
+        "old", help="old run directory, the second latest in tmp by default", nargs="?"
+    )
+    parser.add_argument("new", help="new run directory, the latest in tmp by default", nargs="?")
+    args = parser.parse_args()
+
+    # Create rich console
+    console = Console()
+
+    # Start process timing
+    start_time = time.time()
+    console.print(":rocket: start processing")
+
+    if args.old is None or args.new is None:
+        runs = list_runs()
+        if len(runs) < 2:
+            parser.error("at least two runs in tmp are required")
+        args.old, args.new = args.old or runs[-2], runs[-1]
+    console.print(f":open_file_folder: old run: [yellow]{os.path.abspath(args.old)}[/]")
+    console.print(f":open_file_folder: new run: [yellow]{os.path.abspath(args.new)}[/]")
+
+    counts = Counter()
+    writer = CsvWriter(args.output, DIFF_FIELDS) if args.output else None
+    for row in diff_errors(args.old, args.new):
+        counts[row["month"], row["status"]] += 1
+        if writer:
+            writer.write([row])
+    if writer:
+        writer.close()
+        console.print(f"Write into file:\t [cyan bold]{args.output}[/]")
+
+    console.print(diff_table(counts))
+    console.print(stats_table(read_stats(args.old), read_stats(args.new)))
+
+    # Finish process timing
+    end_time = time.time()
+    elapsed_time = end_time - start_time
+
+    # Print final result
+    console.print(f":hourglass: elapsed time:\t[green bold]{round(elapsed_time, 3)}s[/]")
@@ -1,29 +1,113 @@
 import argparse
+import csv
+import hashlib
+import json
 import os
+import pickle
 
-import numpy as np
-import pandas as pd
-from rich.console import Console
-from rich.progress import track
-
+from icd_tokenize.combination import Combination
 from icd_tokenize.synonym import Synonym
+from icd_tokenize.trie import Trie
+
+# Bump when the layout of the snapshot changes
+SNAPSHOT_VERSION = 2
+SNAPSHOT_FILE = "icd.pkl"
+SOURCE_FILES = ["icd.csv", "synonym.csv", "combination.csv"]
+
+# Bump when the way target diagnoses are scanned from workbooks changes
+MANIFEST_VERSION = 2
+MANIFEST_FILE = "generate.json"
 
 
 class ICD:
-    def __init__(self, dir_path: str = None) -> None:
+    def __init__(self, dir_path: str = None, snapshot: str = None) -> None:
+        """Load the dictionary from its binary snapshot, or from the CSV files if the snapshot
+        is missing or stale."""
         if dir_path is None:
             dir_path = os.path.join(os.path.dirname(__file__), "data")
+        if snapshot is None:
+            snapshot = os.path.join(dir_path, SNAPSHOT_FILE)
+        self.dir_path = dir_path
+        self._trie = None
+
+        if self.load(snapshot):
+            return
 
         # diagnosis
         diagnosis_file = os.path.join(dir_path, "icd.csv")
-        df = pd.read_csv(diagnosis_file)
-        self.diagnosis = df["diagnosis"].to_list()
+        with open(diagnosis_file, newline="", encoding="utf-8") as f:
+            self.diagnosis = [row["diagnosis"] for row in csv.DictReader(f)]
 
         # synonyms
-        self.synonyms = Synonym()
+        self.synonyms = Synonym(dir_path)
+
+        # combinations
+        self.combinations = Combination(dir_path)
+
+    @property
+    def trie(self) -> Trie:
+        """Return the trie of diagnosis, built on first use"""
+        if self._trie is None:
+            self._trie = Trie(self.diagnosis)
+        return self._trie
+
+    def _sources(self) -> dict:
+        """Return the content hash of each source file"""
+        sources = {}
+        for file in SOURCE_FILES:
+            with open(os.path.join(self.dir_path, file), "rb") as f:
+                sources[file] = hashlib.sha256(f.read()).hexdigest()
+        return sources
+
+    def load(self, snapshot: str) -> bool:
+        """Load dictionary from snapshot, return False if it is missing or stale"""
+        if not os.path.exists(snapshot):
+            return False
+        try:
+            with open(snapshot, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return False
+        if data.get("version") != SNAPSHOT_VERSION or data.get("sources") != self._sources():
+            return False
+
+        self.diagnosis = data["diagnosis"]
+        self.synonyms = data["synonyms"]
+        self.combinations = data["combinations"]
+        self._trie = data["trie"]
+        return True
+
+    def compile(self, snapshot: str = None) -> str:
+        """Write binary snapshot of diagnosis, trie, synonyms and combinations"""
+        if snapshot is None:
+            snapshot = os.path.join(self.dir_path, SNAPSHOT_FILE)
+        data = {
+            "version": SNAPSHOT_VERSION,
+            "sources": self._sources(),
+            "diagnosis": self.diagnosis,
+            "synonyms": self.synonyms,
+            "combinations": self.combinations,
+            "trie": self.trie,
+        }
+
+        # Write to a temporary file first, so that readers never see a partial snapshot
+        tmp_file = f"{snapshot}.{os.getpid()}.tmp"
+        with open(tmp_file, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, snapshot)
+        return snapshot
 
     def generate(icd_excel: str = None, data_dir: str = None, output_dir: str = None):
         """Generate icd.csv from icd_excel and data_dir."""
+        from concurrent.futures import ProcessPoolExecutor
+
+        import numpy as np
+        import pandas as pd
+        from rich.console import Console
+        from rich.progress import track
+
+        from icd_tokenize.workbook import Workbook
+
         if icd_excel is None:
             icd_excel = os.path.join(
                 os.path.dirname(__file__), "data", "中文字典_1100712_提供張老師_自定義字典.xlsx"
@@ -69,30 +153,50 @@ class ICD:
         syn_df.to_csv(os.path.join(output_dir, "synonym.csv"), index=False)
         console.print(f'Write into file:\t [cyan bold]{os.path.join(output_dir, "synonym.csv")}[/]')
 
-        icd_set = {}
-        for _, row in icd_df.iterrows():
-            icd_set[row["diagnosis"]] = True
-
+        icd_set = dict.fromkeys(icd_df["diagnosis"], True)
+
+        # Scan target diagnoses of workbooks in parallel. Workbooks are identified by their
+        # absolute path, and ones whose content is unchanged are taken from the manifest of the
+        # previous run instead.
+        manifest_file = os.path.join(output_dir, MANIFEST_FILE)
+        manifest = {}
+        if os.path.exists(manifest_file):
+            with open(manifest_file, encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") != MANIFEST_VERSION:
+                manifest = {}
+        workbooks = manifest.get("workbooks", {})
+
+        files = sorted(file for file in os.listdir(data_dir) if "(00000)" not in file)
+        paths = [os.path.abspath(os.path.join(data_dir, file)) for file in files]
+        with ProcessPoolExecutor() as executor:
+            # Content hashes are kept with the workbook caches, which are built if missing
+            hashes = dict(zip(paths, executor.map(Workbook.sha256, map(Workbook, paths))))
+            stale = [
+                path for path in paths if workbooks.get(path, {}).get("sha256") != hashes[path]
+            ]
+            if stale:
+                results = executor.map(Workbook.targets, map(Workbook, stale))
+                for path, targets in track(
+                    zip(stale, results), total=len(stale), description="[green]scan workbooks"
+                ):
+                    workbooks[path] = {"sha256": hashes[path], "targets": targets}
+        console.print(f"Scan workbooks:\t [cyan bold]{len(stale)}[/] of {len(files)} changed")
+
+        # Workbooks which are not in data_dir are dropped from the manifest
+        workbooks = {path: workbooks[path] for path in paths}
+        tmp_file = f"{manifest_file}.{os.getpid()}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "workbooks": workbooks}, f, ensure_ascii=False)
+        os.replace(tmp_file, manifest_file)
+
+        # Merge target diagnoses which are not in the standard dictionary
         non_icd_set = {}
-        for file in os.listdir(data_dir):
-            if "(00000)" in file:
-                continue
-            df = pd.read_excel(os.path.join(data_dir, file), header=1)
-            df = df.replace(np.nan, "", regex=True)  # replace nan with empty string
-
-            df = df.iloc[:, 23:43]  # 甲.1, 甲2.1, ..., 其他3.1, 其他4.1
-            for col in df.columns:
-                df[col] = df[col].str.normalize("NFKC")
-            df.columns = df.columns.str.rstrip(".1")
-
-            for _, row in track(df.iterrows(), total=len(df), description=f"[green]{file} "):
-                for catalog in ["甲", "乙", "丙", "丁", "其他"]:
-                    for i in ["", "2", "3", "4"]:
-                        key = row[f"{catalog}{i}"]
-                        if key != "" and "?" not in key:
-                            if key not in icd_set:
-                                icd_set[key] = True
-                                non_icd_set[key] = True
+        for workbook in workbooks.values():
+            for key in workbook["targets"]:
+                if key not in icd_set:
+                    icd_set[key] = True
+                    non_icd_set[key] = True
 
         # Remove certain icd from final result
         exclude_icd_df = pd.read_csv(os.path.join(output_dir, "exclude-icd.csv"))
@@ -120,13 +224,25 @@ class ICD:
 
 
 if __name__ == "__main__":
+    from rich.console import Console
+
     parser = argparse.ArgumentParser()
     parser.add_argument("-i", "--icd", help="icd file path")
     parser.add_argument("-o", "--output", help="output directory")
-    parser.add_argument("data", help="data directory", default="data")
+    parser.add_argument(
+        "-c",
+        "--compile",
+        help="only compile binary snapshot of the dictionary",
+        action="store_true",
+    )
+    parser.add_argument("data", help="data directory", nargs="?", default="data")
     args = parser.parse_args()
 
-    if not os.path.exists(args.data):
-        print(f"Directory '{args.data}' doesn't exist.")
+    if not args.compile:
+        if not os.path.exists(args.data):
+            print(f"Directory '{args.data}' doesn't exist.")
+
+        ICD.generate(data_dir=args.data)
 
-    ICD.generate(data_dir=args.data)
+    snapshot = ICD().compile()
+    Console().print(f"Write into file:\t [cyan bold]{snapshot}[/]")
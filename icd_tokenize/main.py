@@ -1,109 +1,158 @@
 import argparse
-import json
 import os
+import sys
 import time
 from concurrent.futures import Future, ProcessPoolExecutor
 from datetime import datetime
 from multiprocessing import Manager
+from typing import Iterator
 
-import numpy as np
-import pandas as pd
-from pandas.io.formats import excel
 from rich.console import Console
 from rich.progress import BarColumn, Progress, TimeRemainingColumn
 
-from icd_tokenize import ICD, Record, Stats, Tokenizer, Validator
+from icd_tokenize import ICD, Data, Record, Stats, Tokenizer, Validator
+from icd_tokenize.cache import CacheInfo
+from icd_tokenize.workbook import Workbook
+from icd_tokenize.writer import (
+    CsvWriter,
+    ExcelWriter,
+    JsonLinesWriter,
+    JsonWriter,
+    ParquetWriter,
+    RecordWriter,
+)
 
-# Disable header style in excel
-excel.ExcelFormatter.header_style = None
+# Number of rows read and tokenized per chunk
+BATCH_SIZE = 1000
 
+# Minimum seconds between two progress reports of a worker
+PROGRESS_INTERVAL = 0.1
 
-def processing_file(
-    progress,
-    task_id,
+# Columns of error result
+ERROR_FIELDS = ["serial", "catalog", "inputs", "results", "targets"]
+
+
+def read_records(
+    workbook: Workbook, year: int, month: int, row_groups: list[int] = None
+) -> Iterator[list[Record]]:
+    """Yield records of workbook, or only of its row_groups, in chunks of BATCH_SIZE rows"""
+    columns = [f"{catalog}{tag}" for catalog in Data.KEYS for tag in Data.TAGS]
+    # Cells of a catalog are kept as tuples, repeated ones (mostly empty) share a single tuple
+    cells: dict[tuple, tuple] = {}
+
+    def shared(cell: tuple) -> tuple:
+        return cells.setdefault(cell, cell)
+
+    for df in workbook.iter_batches(BATCH_SIZE, row_groups=row_groups):
+        # Take each column as a list once, input and target are already normalized by the cache
+        serials = df["流水號"].tolist()
+        numbers = df["NO"].tolist()
+        # Repeated diagnoses share a single interned string
+        inputs = zip(*[list(map(sys.intern, df[col].tolist())) for col in columns])
+        targets = zip(*[list(map(sys.intern, df[f"{col}.1"].tolist())) for col in columns])
+
+        # Collect input and target, each row holds 4 cells of every catalog
+        records: list[Record] = []  # store result of each row
+        for serial, number, row_input, row_target in zip(serials, numbers, inputs, targets):
+            record = Record(
+                year=year,
+                month=month,
+                serial=int(serial),
+                number=int(number),
+                inputs=Data([shared(row_input[i : i + 4]) for i in range(0, 20, 4)]),
+                targets=Data([shared(row_target[i : i + 4]) for i in range(0, 20, 4)]),
+            )
+            records.append(record)
+        yield records
+
+
+def tokenize_records(
+    chunks: Iterator[list[Record]],
     tokenizer: Tokenizer,
     validator: Validator,
+    after_11206: bool = False,
+) -> Iterator[list[Record]]:
+    """Tokenize and validate each chunk, so that repeated cells are only extracted once per chunk"""
+    for records in chunks:
+        results = tokenizer.extract_icd_batch(
+            [record.inputs for record in records], after_11206=after_11206
+        )
+        for record, result in zip(records, results):
+            record.results = result
+            record.corrects = validator.validate_icd(record.results, record.targets)
+            record.identical = validator.identical_icd(record.results, record.targets)
+        yield records
+
+
+def init_worker(progress) -> None:
+    """Load the dictionary once per worker process, instead of pickling it with every task"""
+    global _progress, _tokenizer, _validator
+
+    icd = ICD()
+    _progress = progress
+    _tokenizer = Tokenizer(icd, experimental=False)
+    _validator = Validator(icd)
+
+
+def count_rows(path: str) -> list[int]:
+    """Return the number of rows of each row group, building the workbook cache if necessary"""
+    return Workbook(path).row_groups()
+
+
+def processing_chunk(
+    task_id,
     data_dir: str,
-    output_dir: str,
     file: str,
+    row_groups: list[int],
+    output_dir: str,
     output_json: bool = False,
     output_excel: bool = False,
-):
+    output_parquet: bool = False,
+) -> tuple[Stats, int, CacheInfo]:
+    """Tokenize and validate row_groups of file with the tokenizer of this worker.
+
+    Only the summary and the error rows are returned, together with the process id and the
+    extract cache statistics of this worker. The detailed results are streamed into their files
+    by the worker itself, which requires row_groups to cover the whole file.
+    """
     # Extract year and month from file name
     year_month = file[file.find("(") + 1 : file.find(")")]
     year = int(year_month[:3])
     month = int(year_month[3:])
 
-    # Load Dataset
-    df = pd.read_excel(os.path.join(data_dir, file), header=1)
-    df = df.replace(np.nan, "", regex=True)  # replace nan with empty string
-
-    # Split input and target and normalize data
-    df_input = df.iloc[:, 1:21]  # 甲, 甲2, ..., 其他3, 其他4
-    for col in df_input.columns:
-        df_input[col] = df_input[col].str.normalize("NFKC")
-    df_target = df.iloc[:, 23:43]  # 甲.1, 甲2.1, ..., 其他3.1, 其他4.1
-    df_target.columns = df_target.columns.str.rstrip(".1")  # remove ".1" in column name
-    for col in df_target.columns:
-        df_target[col] = df_target[col].str.normalize("NFKC")
-
-    # Tokenize input
-    records: list[Record] = []  # store result of each row
-    len_of_task = len(df_input.index)
-    for idx, row in df_input.iterrows():
-        progress[task_id] = {"completed": idx + 1, "total": len_of_task}
-        record = Record(
-            year=year, month=month, serial=int(df["流水號"][idx]), number=int(df["NO"][idx])
-        )
-        # Collect input and target
-        for catalog in ["甲", "乙", "丙", "丁", "其他"]:
-            record.inputs[catalog] = []
-            record.targets[catalog] = []
-            for tag in ["", "2", "3", "4"]:
-                data = row[f"{catalog}{tag}"]
-                record.inputs[catalog].append(data)
-                record.targets[catalog].append(df_target[f"{catalog}{tag}"][idx])
-
-        record.results = tokenizer.extract_icd(
-            record.inputs, after_11206=(year >= 112 and month >= 6)
-        )
-        record.corrects = validator.validate_icd(record.results, record.targets)
-        record.identical = validator.identical_icd(record.results, record.targets)
-
-        # Collect result
-        records.append(record)
+    # Stream the rows through the pipeline chunk by chunk
+    chunks = read_records(Workbook(os.path.join(data_dir, file)), year, month, row_groups)
+    chunks = tokenize_records(
+        chunks, _tokenizer, _validator, after_11206=(year >= 112 and month >= 6)
+    )
 
-    # Dump error result
+    # Open writers of detailed results
     record_dir = f"{output_dir}/{year_month}"
-    os.makedirs(f"{record_dir}")
-    errors = [error for r in records if not r.is_correct for error in r.get_errors()]
-    pd.DataFrame(errors).to_csv(f"{record_dir}/{year_month}.csv", index=False)
-
-    # Dump json result
+    writers: list[RecordWriter] = []
     if output_json:
-        with open(f"{record_dir}/{year_month}.json", "w", encoding="utf-8") as f:
-            json_records = [e.for_json() for e in records]
-            json.dump(json_records, f, ensure_ascii=False)
-
-    # Dump excel result
+        writers.append(JsonWriter(f"{record_dir}/{year_month}.json"))
     if output_excel:
-        with pd.ExcelWriter(f"{record_dir}/{year_month}.xlsx", engine="xlsxwriter") as writer:
-
-            def dump_excel(excels: list[tuple[str, str, str]], sheet_name: str):
-                index, before, after = zip(*excels)
-                pd.DataFrame(index).to_excel(writer, sheet_name, index=False)
-                pd.DataFrame(before).to_excel(writer, sheet_name, index=False, startcol=3)
-                pd.DataFrame(after).to_excel(writer, sheet_name, index=False, startcol=24)
-                worksheet = writer.sheets[sheet_name]
-                worksheet.write_string(0, 2, "斷詞前")
-                worksheet.write_string(0, 23, "斷詞後")
-
-            dump_excel([e.for_excel() for e in records if e.is_correct], f"{year_month}_斷詞正確")
-            dump_excel(
-                [e.for_excel() for e in records if not e.is_correct], f"{year_month}_斷詞錯誤"
-            )
+        writers.append(ExcelWriter(f"{record_dir}/{year_month}.xlsx", year_month))
+    if output_parquet:
+        writers.append(ParquetWriter(f"{record_dir}/{year_month}.parquet"))
+
+    stats = Stats(name=year_month)  # summary of all rows
+    reported, pending = time.monotonic(), 0
+    for chunk in chunks:
+        stats.update(chunk)
+        for writer in writers:
+            writer.write(chunk)
+        pending += len(chunk)
+        # Report at most once per interval, the rest is reported after the last chunk
+        if time.monotonic() - reported >= PROGRESS_INTERVAL:
+            _progress.put((task_id, pending))
+            reported, pending = time.monotonic(), 0
+    if pending:
+        _progress.put((task_id, pending))
 
-    return Stats(name=year_month, records=records)
+    for writer in writers:
+        writer.close()
+    return stats, os.getpid(), _tokenizer.cache_info()
 
 
 if __name__ == "__main__":
@@ -115,6 +164,12 @@ if __name__ == "__main__":
     parser.add_argument(
         "-e", "--excel", help="output result collection in format of excel", action="store_true"
     )
+    parser.add_argument(
+        "-p",
+        "--parquet",
+        help="output result collection in format of parquet",
+        action="store_true",
+    )
     args = parser.parse_args()
 
     # Create rich console
@@ -134,11 +189,6 @@ if __name__ == "__main__":
         f":open_file_folder: create output directory: [yellow]{os.path.abspath(tmp_record_dir)}[/]"
     )
 
-    # Initialize ICD Tools
-    icd = ICD()
-    tokenizer = Tokenizer(icd, experimental=False)
-    validator = Validator(icd)
-
     # List all files in data directory
     data_dir = "data"
     files = os.listdir(data_dir)
@@ -146,60 +196,112 @@ if __name__ == "__main__":
     files = list(filter(lambda f: "(00000)" not in f, files))
 
     stats_list: list[Stats] = []  # statistical data of processing results from each files
+    cache_infos: dict[int, CacheInfo] = {}  # latest extract cache statistics of each worker
     with Progress(
         "[progress.description]{task.description}",
         BarColumn(),
         "[progress.percentage]{task.percentage:>3.0f}%",
         TimeRemainingColumn(),
     ) as progress:
-        futures: list[Future] = []  # keep track of the jobs
         with Manager() as manager:
-            # this is the key - we share some state between our
-            # main process and our worker functions
-            _progress = manager.dict()
-            with ProcessPoolExecutor() as executor:
+            # Workers put (task_id, advance) into the queue, and a None is put for each
+            # finished chunk, so the main process only wakes up when there is an update
+            queue = manager.Queue()
+            with ProcessPoolExecutor(initializer=init_worker, initargs=(queue,)) as executor:
+                # Build missing workbook caches in parallel and split files into row groups
+                paths = [os.path.join(data_dir, file) for file in files]
+                sizes = dict(zip(files, executor.map(count_rows, paths)))
+
+                # Schedule the largest chunks first, so that no worker is left with a big chunk
+                # at the end. Detailed results are written per file, so a file is a single chunk
+                # when they are requested.
+                task_ids = {}
+                chunks = []
                 for file in files:
-                    task_id = progress.add_task(f":page_facing_up: [green]{file}", visible=False)
-                    futures.append(
-                        executor.submit(
-                            processing_file,
-                            _progress,
-                            task_id,
-                            tokenizer,
-                            validator,
-                            data_dir,
-                            tmp_record_dir,
-                            file,
-                            args.json,
-                            args.excel,
+                    year_month = file[file.find("(") + 1 : file.find(")")]
+                    os.makedirs(f"{tmp_record_dir}/{year_month}")
+                    task_ids[file] = progress.add_task(
+                        f":page_facing_up: [green]{file}", total=sum(sizes[file]), visible=False
+                    )
+                    if args.json or args.excel or args.parquet:
+                        chunks.append((sum(sizes[file]), sum(sizes[file]), file, None))
+                    else:
+                        chunks.extend(
+                            (size, sum(sizes[file]), file, [i])
+                            for i, size in enumerate(sizes[file])
                         )
+                chunks.sort(key=lambda chunk: chunk[:2], reverse=True)
+
+                # keep track of the jobs of each file:
+                futures: dict[str, list[tuple[list[int], Future]]] = {file: [] for file in files}
+                for _, _, file, row_groups in chunks:
+                    future = executor.submit(
+                        processing_chunk,
+                        task_ids[file],
+                        data_dir,
+                        file,
+                        row_groups,
+                        tmp_record_dir,
+                        args.json,
+                        args.excel,
+                        args.parquet,
                     )
+                    future.add_done_callback(lambda _: queue.put(None))
+                    futures[file].append((row_groups or [], future))
 
                 # monitor the progress:
-                while (n_finished := sum([future.done() for future in futures])) < len(futures):
-                    for task_id, update_data in _progress.items():
-                        completed = update_data["completed"]
-                        total = update_data["total"]
-                        # update the progress bar for this task:
-                        progress.update(
-                            task_id,
-                            total=total,
-                            completed=completed,
-                            visible=(completed > 0),
-                        )
+                n_finished = 0
+                while n_finished < len(chunks):
+                    update_data = queue.get()
+                    if update_data is None:
+                        n_finished += 1
+                        continue
+                    task_id, advance = update_data
+                    # update the progress bar for this task:
+                    progress.update(task_id, advance=advance, visible=True)
+
+                # raise any errors and merge chunks of each file in order:
+                for file in files:
+                    year_month = file[file.find("(") + 1 : file.find(")")]
+                    futures[file].sort(key=lambda job: job[0])
+                    chunk_stats = []
+                    for _, future in futures[file]:
+                        stats, pid, cache_info = future.result()
+                        chunk_stats.append(stats)
+                        # Statistics of a worker only grow, so keep the one with most lookups
+                        latest = cache_infos.get(pid)
+                        if latest is None or latest.lookups < cache_info.lookups:
+                            cache_infos[pid] = cache_info
+                    stats_list.append(Stats.sum(chunk_stats, name=year_month))
 
-                # raise any errors:
-                for future in futures:
-                    stats_list.append(future.result())
+    # Dump error result of each file, in csv for reading and in json lines for analyze.py
+    for stats in stats_list:
+        path = f"{tmp_record_dir}/{stats.name}/{stats.name}"
+        with CsvWriter(f"{path}.csv", ERROR_FIELDS) as writer:
+            writer.write(stats.errors)
+        with JsonLinesWriter(f"{path}.jsonl") as writer:
+            writer.write(stats.errors)
 
     # Dump process information
-    total_stats = Stats.sum(stats_list)
+    total_stats = Stats.sum(stats_list, errors=False)
     df_stats = Stats.dataframe(stats_list, total=total_stats)
     df_stats.to_csv(f"{tmp_record_dir}/result.csv", index=False)
 
     # Display result Table of each file
     console.print(Stats.table(stats_list, total=total_stats, title="Result"))
 
+    # Display extract cache statistics summed over workers, to help sizing the cache
+    if cache_infos:
+        infos = list(cache_infos.values())
+        cache_info = sum(infos[1:], infos[0])
+        console.print(
+            f":card_file_box: extract cache of {len(infos)} workers:\t"
+            f"[green bold]{round(cache_info.hit_rate * 100, 2)}%[/] hit rate, "
+            f"{cache_info.hits} hits, {cache_info.misses} misses, "
+            f"{cache_info.evictions} evictions, {cache_info.size} entries "
+            f"(maxsize {cache_info.maxsize} per worker)"
+        )
+
     # Finish process timing
     end_time = time.time()
     elapsed_time = end_time - start_time
@@ -0,0 +1,221 @@
+import re
+import unicodedata
+
+
+class Normalizer:
+    """Compiled normalization applied to every input cell before tokenization."""
+
+    # Lookaround rules for 併, applied in order
+    CONJUNCTIONS = [
+        (r"(?<!合)併(?!發)", ""),
+        (r"合併(?!症)", ""),
+        (r"併發(?!症)", ""),
+    ]
+
+    # Literal deletions, longest first so that alternation prefers the longer match
+    DELETIONS = [
+        "無明顯外傷性死因",
+        "無外傷性死因",
+        "無明顯外傷",
+        "非新冠肺炎",
+        "未明",
+        "及",
+        "並",
+        "_",
+    ]
+
+    # Literal rewrites, applied in order
+    REWRITES = [
+        ("風溼", "風濕"),
+        ("濕疹", "溼疹"),
+        ("墬落", "墜落"),
+        ("吸菸", "吸煙"),
+        ("膿傷", "膿瘍"),
+        ("哽塞", "梗塞"),
+        ("心血管疾患", "心血管疾病"),
+        ("肺部疾患", "肺部疾病"),
+        ("腦血管疾患", "腦血管疾病"),
+        ("末期腎疾患", "末期腎疾病"),
+        ("排尿障礙", "排尿困難"),
+        ("慢性老化性失智症", "慢性老年失智症"),
+        ("心因性猝逝", "心因性猝死"),
+        ("敗血休克", "敗血性休克"),
+        ("鬱血心衰竭", "鬱血性心衰竭"),
+        ("急性缺氧呼吸衰竭", "急性缺氧性呼吸衰竭"),
+        ("呼吸中止症", "呼吸中止症候群"),
+        ("免疫低下", "免疫力低下"),
+        ("瀰漫大B細胞淋巴瘤", "瀰漫性大B細胞淋巴瘤"),
+        ("反覆肺炎", "反覆性肺炎"),
+        ("武漢肺炎", "新冠肺炎"),
+        ("嚴重特殊傳染性疾病確診", "新冠肺炎"),
+        ("乳腺惡性腫瘤", "乳腺癌"),
+        ("大出血", "出血"),
+        ("本態性(原發性)高血壓", "本態性高血壓"),
+        ("腦中風病史", "腦中風"),
+        ("清潔劑", "清潔劑中毒"),
+        ("農藥", "農藥中毒"),
+        ("糖尿病(第二型)", "第二型糖尿病"),
+        ("口腔部位囊腫", "口腔腫瘤"),
+        ("泌尿系統用藥", "泌尿系統疾患"),
+        ("待解剖", "司法相驗中"),
+        ("嚴重傳染性肺炎", "嚴重特殊傳染性肺炎"),
+        ("新冠狀病毒感染", "新冠病毒感染"),
+        ("嚴重特殊傳染肺炎", "嚴重特殊傳染性肺炎"),
+        ("新冠確診", "新冠肺炎"),
+        ("腎衰竭末期", "末期腎衰竭"),
+        ("腎臟病末期", "末期腎臟病"),
+        ("非何杰金氏惡性淋巴癌", "非何杰金氏惡性淋巴瘤"),
+        ("器官未發育", "器官發育不良"),
+        ("貳拾壹", "21"),
+        ("貳拾", "20"),
+        ("COVID19", "COVID-19"),
+    ]
+
+    # Whole-cell replacements
+    EXACT = {
+        "燒碳": "燒炭",
+        "洗腎": "腎衰竭",
+    }
+
+    PREGNANCY_WEEKS = re.compile(r"(\d+(?:\.\d+)?)\s*(週)")
+    PREGNANCY_WEIGHT = re.compile(r"(\d+(?:\.\d+)?)\s*(公克)")
+
+    def __init__(self) -> None:
+        self.conjunctions = [(re.compile(p), r) for p, r in self.CONJUNCTIONS]
+        self.deletion = re.compile("|".join(map(re.escape, self.DELETIONS)) + r"|\s")
+
+        self.rewrites = dict(self.REWRITES)
+        self.rewrite = re.compile("|".join(map(re.escape, self.rewrites)))
+
+        # A single pass over all rewrites gives the same result as applying them one by one
+        # unless a rewrite overlaps another pattern or produces text that a later one matches.
+        # Matching any of these patterns falls back to the sequential replacement.
+        patterns = list(self.rewrites)
+        self.hazards = set()
+        for i, (pattern, repl) in enumerate(self.rewrites.items()):
+            for j, other in enumerate(patterns):
+                if i != j and self._overlap(pattern, other):
+                    self.hazards.add(pattern)
+                if j > i and self._overlap(repl, other):
+                    self.hazards.add(pattern)
+
+    def __call__(self, data: str) -> str:
+        if not unicodedata.is_normalized("NFKC", data):
+            data = unicodedata.normalize("NFKC", data)
+
+        if "併" in data:
+            for pattern, repl in self.conjunctions:
+                data = pattern.sub(repl, data)
+
+        data = self._delete(data)
+        data = self._rewrite(data)
+
+        data = self.EXACT.get(data, data)
+        if "懷孕" in data:
+            data = self._pregnancy(data)
+        data = self._traffic(data)
+
+        return data
+
+    @staticmethod
+    def _overlap(str1: str, str2: str) -> bool:
+        """Return True if one string contains the other or they overlap at the ends"""
+        if str1 in str2 or str2 in str1:
+            return True
+        for i in range(1, min(len(str1), len(str2))):
+            if str1.endswith(str2[:i]) or str2.endswith(str1[:i]):
+                return True
+        return False
+
+    def _delete(self, data: str) -> str:
+        result = self.deletion.sub("", data)
+        # Removing text may join a new match, which only the sequential order handles
+        if result != data and self.deletion.search(result):
+            result = data
+            for pattern in self.DELETIONS:
+                result = result.replace(pattern, "")
+            result = re.sub(r"\s", "", result)
+        return result
+
+    def _rewrite(self, data: str) -> str:
+        matches = []
+
+        def replace(match: re.Match) -> str:
+            matches.append(match.group())
+            return self.rewrites[match.group()]
+
+        result = self.rewrite.sub(replace, data)
+        if not self.hazards.isdisjoint(matches):
+            result = data
+            for pattern, repl in self.rewrites.items():
+                result = result.replace(pattern, repl)
+        return result
+
+    def _pregnancy(self, data: str) -> str:
+        possible = ""
+        d_match = self.PREGNANCY_WEEKS.search(data)
+        w_match = self.PREGNANCY_WEIGHT.search(data)
+        if d_match:
+            duration = int(d_match.group(1))
+            if duration < 28:
+                possible += "早產兒少於28週"
+        if w_match:
+            weight = int(w_match.group(1))
+            if weight < 999:
+                possible += "早產兒<999克"
+        if possible != "":
+            data = possible
+        return data
+
+    def _traffic(self, data: str) -> str:
+        if "行人" in data:
+            if "機車" in data:
+                data = "車禍B1行人*機車"
+            elif "摩托車" in data:
+                data = "車禍B1行人*機車"
+            elif "小客車" in data:
+                data = "車禍B2行人*汽車"
+            elif "大貨車" in data:
+                data = "車禍B4行人*大貨車"
+            elif "大客車" in data:
+                data = "車禍B4行人*大貨車"
+            elif "貨車" in data:
+                data = "車禍B3行人*貨車"
+            elif "火車" in data:
+                data = "車禍B6行人*火車"
+        elif "機車騎士" in data:
+            if "小客" in data:
+                data = "車禍D1機車騎士*汽車"
+            elif "汽車" in data:
+                data = "車禍D1機車騎士*汽車"
+            elif "大貨車" in data:
+                data = "車禍D3機車騎士*大貨車"
+            elif "貨車" in data:
+                data = "車禍D2機車騎士*貨車"
+            elif "腳踏車" in data:
+                data = "車禍D0機車騎士*腳踏車"
+            elif "曳引車" in data:
+                data = "車禍D3機車騎士*曳引車"
+            elif "自行車" in data:
+                data = "車禍D0機車騎士*腳踏車"
+        elif "機車" in data:
+            if "小客" in data or "汽車" in data:
+                data = "車禍A21機車*汽車"
+            elif "大貨車" in data:
+                data = "車禍D3機車騎士*大貨車"
+            elif "貨車" in data:
+                data = "車禍A22機車*貨車"
+            elif "自撞" in data:
+                data = "'車禍D6機車騎士*撞靜態物體'"
+            elif data.count("機車") == 2:
+                data = "車禍A20機車"
+        elif "自行車" in data or "腳踏車" in data:
+            if "小客" in data or "汽車" in data:
+                data = "車禍C2腳踏車騎士*汽車"
+            elif "機車" in data:
+                data = "車禍C1腳踏車騎士*機車"
+            elif "摩托車" in data:
+                data = "車禍C1腳踏車騎士*機車"
+            elif "貨車" in data:
+                data = "車禍C3腳踏車騎士*小貨車"
+        return data
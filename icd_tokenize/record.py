@@ -1,24 +1,61 @@
-from dataclasses import dataclass, field
-
 from icd_tokenize.data import Data
 from icd_tokenize.status import Status
 
 
-@dataclass
 class Record:
     """
     Store result of each tokenized data
     """
 
-    year: int
-    month: int
-    serial: int
-    number: int
-    identical: Status = field(default_factory=dict)
-    corrects: Status = field(default_factory=dict)
-    inputs: Data = field(default_factory=lambda: Data())
-    results: Data = field(default_factory=lambda: Data())
-    targets: Data = field(default_factory=lambda: Data())
+    __slots__ = (
+        "year",
+        "month",
+        "serial",
+        "number",
+        "identical",
+        "corrects",
+        "inputs",
+        "results",
+        "targets",
+    )
+
+    def __init__(
+        self,
+        year: int,
+        month: int,
+        serial: int,
+        number: int,
+        identical: Status = None,
+        corrects: Status = None,
+        inputs: Data = None,
+        results: Data = None,
+        targets: Data = None,
+    ) -> None:
+        self.year = year
+        self.month = month
+        self.serial = serial
+        self.number = number
+        self.identical = identical if identical is not None else Status()
+        self.corrects = corrects if corrects is not None else Status()
+        self.inputs = inputs if inputs is not None else Data()
+        self.results = results if results is not None else Data()
+        self.targets = targets if targets is not None else Data()
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Record):
+            return NotImplemented
+        return all(getattr(self, key) == getattr(other, key) for key in self.__slots__)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{key}={getattr(self, key)!r}" for key in self.__slots__)
+        return f"Record({fields})"
+
+    def __getstate__(self):
+        return tuple(getattr(self, key) for key in self.__slots__)
+
+    def __setstate__(self, state) -> None:
+        for key, value in zip(self.__slots__, state):
+            setattr(self, key, value)
 
     @property
     def is_correct(self):
@@ -47,11 +84,10 @@ class Record:
             "死因自動流水號": str(self.serial).zfill(6),
         }
 
-        for catalog, code in enumerate(Data.KEYS, Data.CODES):
-            if len(self.results[catalog]) < 4:
-                self.results[catalog] += ["" for _ in range(4 - len(self.results[catalog]))]
+        for catalog, code in zip(Data.KEYS, Data.CODES):
+            results = list(self.results[catalog]) + [""] * (4 - len(self.results[catalog]))
             for i in range(4):
-                data[f"{code}{i + 1}"] = self.results[catalog][i]
+                data[f"{code}{i + 1}"] = results[i]
 
         return data
 
@@ -62,15 +98,13 @@ class Record:
         after = {}
 
         for catalog in ["甲", "乙", "丙", "丁", "其他"]:
-            if len(self.inputs[catalog]) < 4:
-                self.inputs[catalog] += ["" for _ in range(4 - len(self.inputs[catalog]))]
-
-            if len(self.results[catalog]) < 4:
-                self.results[catalog] += ["" for _ in range(4 - len(self.results[catalog]))]
+            # Inputs and targets are tuples, so pad copies instead of extending in place
+            inputs = list(self.inputs[catalog]) + [""] * (4 - len(self.inputs[catalog]))
+            results = list(self.results[catalog]) + [""] * (4 - len(self.results[catalog]))
 
             for i, tag in enumerate(["", "2", "3", "4"]):
-                before[f"{catalog}{tag}"] = self.inputs[catalog][i]
-                after[f"{catalog}{tag}"] = self.results[catalog][i]
+                before[f"{catalog}{tag}"] = inputs[i]
+                after[f"{catalog}{tag}"] = results[i]
 
         return index, before, after
 
@@ -1,32 +1,52 @@
 from dataclasses import dataclass, field
 
-import pandas as pd
-from rich.table import Table
-
 from .record import Record
 
 
 @dataclass
 class Stats:
-    """Store result of all tokenized data"""
+    """Store summary of all tokenized data"""
 
     name: str = ""
-    records: list[Record] = field(default_factory=lambda: [])
+    identical: int = 0
+    correct: int = 0
+    total: int = 0
+    dirty: int = 0
+    errors: list[dict] = field(default_factory=lambda: [])
 
-    @property
-    def total(self):
-        """Return the number of total records"""
-        return len(self.records)
+    def add(self, record: Record, errors: bool = True):
+        """Count record, and keep its error rows if errors"""
+        self.total += 1
+        if record.is_identical:
+            self.identical += 1
+        if record.is_correct:
+            self.correct += 1
+        elif errors:
+            self.errors.extend(record.get_errors())
+        self.dirty += record.dirty
 
-    @property
-    def correct(self):
-        """Return the number of correct records"""
-        return [r.is_correct for r in self.records].count(True)
+    def update(self, records: list[Record], errors: bool = True):
+        """Count each of records, and keep their error rows if errors"""
+        for record in records:
+            self.add(record, errors)
 
-    @property
-    def identical(self):
-        """Return the number of identical records"""
-        return [r.is_identical for r in self.records].count(True)
+    def __iadd__(self, other: "Stats") -> "Stats":
+        self.identical += other.identical
+        self.correct += other.correct
+        self.total += other.total
+        self.dirty += other.dirty
+        self.errors.extend(other.errors)
+        return self
+
+    def __add__(self, other: "Stats") -> "Stats":
+        return Stats(
+            name=self.name,
+            identical=self.identical + other.identical,
+            correct=self.correct + other.correct,
+            total=self.total + other.total,
+            dirty=self.dirty + other.dirty,
+            errors=self.errors + other.errors,
+        )
 
     @property
     def correct_rate(self):
@@ -38,11 +58,6 @@ class Stats:
         """Return the identical rate"""
         return self.identical / self.total
 
-    @property
-    def dirty(self):
-        """Return the number of records that contains '?'"""
-        return sum([r.dirty for r in self.records])
-
     @property
     def simple(self):
         return {
@@ -56,23 +71,33 @@ class Stats:
         }
 
     @staticmethod
-    def sum(stats: list["Stats"], name: str = "total"):
-        """Return the sum of stats"""
-        return Stats(name, [r for s in stats for r in s.records])
+    def sum(stats: list["Stats"], name: str = "total", errors: bool = True):
+        """Return the sum of stats, with their error rows if errors"""
+        total = Stats(name)
+        for s in stats:
+            if errors:
+                total += s
+            else:
+                total += Stats(s.name, s.identical, s.correct, s.total, s.dirty)
+        return total
 
     @staticmethod
     def dataframe(stats: list["Stats"], total=None):
         """Return the dataframe of stats"""
+        import pandas as pd
+
         if total is None:
-            total = Stats.sum(stats)
+            total = Stats.sum(stats, errors=False)
         return pd.DataFrame([s.simple for s in stats] + [total.simple])
 
     @staticmethod
     def table(stats: list["Stats"], total=None, title: str = "Result", show_footer: bool = True):
         """Return the table of stats"""
+        from rich.table import Table
+
         table = Table(title=title, show_footer=show_footer)
         if total is None:
-            total = Stats.sum(stats)
+            total = Stats.sum(stats, errors=False)
         total = total.simple
         table.add_column("File", footer="Total", justify="center")
         table.add_column("Identical", footer=str(total["identical"]), justify="center")
@@ -86,13 +111,14 @@ class Stats:
         )
         table.add_column("Dirty", footer=str(total["dirty"]), justify="center")
         for s in stats:
+            simple = s.simple
             table.add_row(
-                s.simple["name"],
-                str(s.simple["identical"]),
-                str(s.simple["correct"]),
-                str(s.simple["total"]),
-                f"{round(s.simple['identical_rate'] * 100, 2)}%",
-                f"{round(s.simple['correct_rate'] * 100, 2)}%",
-                str(s.simple["dirty"]),
+                simple["name"],
+                str(simple["identical"]),
+                str(simple["correct"]),
+                str(simple["total"]),
+                f"{round(simple['identical_rate'] * 100, 2)}%",
+                f"{round(simple['correct_rate'] * 100, 2)}%",
+                str(simple["dirty"]),
             )
         return table
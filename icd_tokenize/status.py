@@ -1,8 +1,12 @@
-class Status(dict):
-    def __init__(self):
-        super().__init__()
-        self["甲"] = False
-        self["乙"] = False
-        self["丙"] = False
-        self["丁"] = False
-        self["其他"] = False
+from icd_tokenize.data import Data
+
+
+class Status(Data):
+    """Status of each catalog, stored in slots instead of a dict"""
+
+    __slots__ = ()
+
+    def __init__(self, values=None):
+        if values is None:
+            values = [False for _ in self.KEYS]
+        super().__init__(values)
@@ -1,7 +1,6 @@
+import csv
 import os
 
-import pandas as pd
-
 
 class Synonym(dict):
     def __init__(self, dir_path: str = None) -> None:
@@ -11,8 +10,28 @@ class Synonym(dict):
             dir_path = os.path.join(os.path.dirname(__file__), "data")
 
         synonym_file = os.path.join(dir_path, "synonym.csv")
-        df = pd.read_csv(synonym_file)
-        for _, row in df.iterrows():
-            icd = row["ICD1"]
-            synonyms = row["diagnosis"]
-            self[synonyms] = icd
+        with open(synonym_file, newline="", encoding="utf-8") as f:
+            self.update((row["diagnosis"], row["ICD1"]) for row in csv.DictReader(f))
+
+    def copy(self) -> "Synonym":
+        """Return a copy which can be edited without affecting readers of this dictionary"""
+        synonyms = Synonym.__new__(Synonym)
+        synonyms.update(self)
+        return synonyms
+
+    def unique(self, data: list) -> list:
+        """Return data without the diagnoses which share an ICD code with an earlier one"""
+        result = []
+        codes = set()
+        for d in data:
+            code = self.get(d)
+            if code is None:
+                result.append(d)
+            elif code not in codes:
+                codes.add(code)
+                result.append(d)
+        return result
+
+    def has_code(self, data: list, code: str) -> bool:
+        """Return True if any diagnosis in data is a synonym of the ICD code"""
+        return any(self.get(d) == code for d in data)
@@ -1,166 +1,107 @@
-import ast
-import re
+import threading
+from functools import partial
+from typing import Iterable
 
-import pandas as pd
-import pygtrie
-from rich.console import Console
-from rich.table import Table
-
-from icd_tokenize import ICD
+from icd_tokenize.cache import CacheInfo, LRUCache
 from icd_tokenize.data import Data
+from icd_tokenize.icd import ICD
+from icd_tokenize.normalizer import Normalizer
+from icd_tokenize.synonym import Synonym
+from icd_tokenize.trie import Trie
 from icd_tokenize.validator import Validator
 
 
 class Tokenizer:
-    def __init__(self, icd: ICD = None, experimental=False) -> None:
+    def __init__(self, icd: ICD = None, experimental=False, cache_size: int = 65536) -> None:
+        """Initialize tokenizer.
+
+        ``cache_size`` bounds the number of memoized ``extract`` results, None for unbounded and
+        0 to disable memoization.
+        """
         if icd is None:
             icd = ICD()
-        self.trie = pygtrie.CharTrie()
-        for element in icd.diagnosis:
-            self.trie[element] = True
-
-        self.synonyms = icd.synonyms
+        self.normalizer = Normalizer()
 
         self.experimental = experimental
 
-    def _pre_process(self, data: str) -> str:
-        data = re.sub(r"(?<!合)併(?!發)", "", data)
-        data = re.sub(r"合併(?!症)", "", data)
-        data = re.sub(r"併發(?!症)", "", data)
-        data = re.sub(r"無明顯外傷性死因", "", data)
-        data = re.sub(r"無外傷性死因", "", data)
-        data = re.sub(r"無明顯外傷", "", data)
-        data = re.sub(r"非新冠肺炎", "", data)
-        data = re.sub(r"未明", "", data)
-        data = re.sub(r"及", "", data)
-        data = re.sub(r"並", "", data)
-        data = re.sub(r"_", "", data)
-        data = re.sub(r"\s", "", data)
-
-        data = re.sub(r"風溼", "風濕", data)
-        data = re.sub(r"濕疹", "溼疹", data)
-        data = re.sub(r"墬落", "墜落", data)
-        data = re.sub(r"吸菸", "吸煙", data)
-        data = re.sub(r"膿傷", "膿瘍", data)
-        data = re.sub(r"哽塞", "梗塞", data)
-
-        data = re.sub(r"心血管疾患", "心血管疾病", data)
-        data = re.sub(r"肺部疾患", "肺部疾病", data)
-        data = re.sub(r"腦血管疾患", "腦血管疾病", data)
-        data = re.sub(r"末期腎疾患", "末期腎疾病", data)
-        data = re.sub(r"排尿障礙", "排尿困難", data)
-        data = re.sub(r"慢性老化性失智症", "慢性老年失智症", data)
-        data = re.sub(r"心因性猝逝", "心因性猝死", data)
-
-        data = re.sub(r"慢性老化性失智症", "慢性失智症", data)
-        data = re.sub(r"敗血休克", "敗血性休克", data)
-        data = re.sub(r"鬱血心衰竭", "鬱血性心衰竭", data)
-        data = re.sub(r"急性缺氧呼吸衰竭", "急性缺氧性呼吸衰竭", data)
-        data = re.sub(r"呼吸中止症", "呼吸中止症候群", data)
-        data = re.sub(r"免疫低下", "免疫力低下", data)
-        data = re.sub(r"瀰漫大B細胞淋巴瘤", "瀰漫性大B細胞淋巴瘤", data)
-        data = re.sub(r"反覆肺炎", "反覆性肺炎", data)
-
-        data = re.sub(r"武漢肺炎", "新冠肺炎", data)
-        data = re.sub(r"嚴重特殊傳染性疾病確診", "新冠肺炎", data)
-        data = re.sub(r"乳腺惡性腫瘤", "乳腺癌", data)
-        data = re.sub(r"大出血", "出血", data)
-        data = re.sub(r"本態性\(原發性\)高血壓", "本態性高血壓", data)
-        data = re.sub(r"腦中風病史", "腦中風", data)
-        data = re.sub(r"清潔劑", "清潔劑中毒", data)
-        data = re.sub(r"農藥", "農藥中毒", data)
-        data = re.sub(r"糖尿病\(第二型\)", "第二型糖尿病", data)
-        data = re.sub(r"口腔部位囊腫", "口腔腫瘤", data)
-        data = re.sub(r"泌尿系統用藥", "泌尿系統疾患", data)
-        data = re.sub(r"待解剖", "司法相驗中", data)
-        data = re.sub(r"嚴重傳染性肺炎", "嚴重特殊傳染性肺炎", data)
-        data = re.sub(r"新冠狀病毒感染", "新冠病毒感染", data)
-        data = re.sub(r"嚴重特殊傳染肺炎", "嚴重特殊傳染性肺炎", data)
-        data = re.sub(r"新冠確診", "新冠肺炎", data)
-        data = re.sub(r"腎衰竭末期", "末期腎衰竭", data)
-        data = re.sub(r"腎臟病末期", "末期腎臟病", data)
-        data = re.sub(r"非何杰金氏惡性淋巴癌", "非何杰金氏惡性淋巴瘤", data)
-        data = re.sub(r"器官未發育", "器官發育不良", data)
-        data = re.sub(r"貳拾壹", "21", data)
-        data = re.sub(r"貳拾", "20", data)
-
-        data = data.replace("COVID19", "COVID-19")
-
-        if data == "燒碳":
-            data = "燒炭"
-        if data == "洗腎":
-            data = "腎衰竭"
-        if "懷孕" in data:
-            possible = ""
-            d = re.compile(r"(\d+(?:\.\d+)?)\s*(週)")
-            w = re.compile(r"(\d+(?:\.\d+)?)\s*(公克)")
-            d_match = d.search(data)
-            w_match = w.search(data)
-            if d_match:
-                duration = int(d_match.group(1))
-                if duration < 28:
-                    possible += "早產兒少於28週"
-            if w_match:
-                weight = int(w_match.group(1))
-                if weight < 999:
-                    possible += "早產兒<999克"
-            if possible != "":
-                data = possible
-
-        if "行人" in data:
-            if "機車" in data:
-                data = "車禍B1行人*機車"
-            elif "摩托車" in data:
-                data = "車禍B1行人*機車"
-            elif "小客車" in data:
-                data = "車禍B2行人*汽車"
-            elif "大貨車" in data:
-                data = "車禍B4行人*大貨車"
-            elif "大客車" in data:
-                data = "車禍B4行人*大貨車"
-            elif "貨車" in data:
-                data = "車禍B3行人*貨車"
-            elif "火車" in data:
-                data = "車禍B6行人*火車"
-        elif "機車騎士" in data:
-            if "小客" in data:
-                data = "車禍D1機車騎士*汽車"
-            elif "汽車" in data:
-                data = "車禍D1機車騎士*汽車"
-            elif "大貨車" in data:
-                data = "車禍D3機車騎士*大貨車"
-            elif "貨車" in data:
-                data = "車禍D2機車騎士*貨車"
-            elif "腳踏車" in data:
-                data = "車禍D0機車騎士*腳踏車"
-            elif "曳引車" in data:
-                data = "車禍D3機車騎士*曳引車"
-            elif "自行車" in data:
-                data = "車禍D0機車騎士*腳踏車"
-        elif "機車" in data:
-            if "小客" in data or "汽車" in data:
-                data = "車禍A21機車*汽車"
-            elif "大貨車" in data:
-                data = "車禍D3機車騎士*大貨車"
-            elif "貨車" in data:
-                data = "車禍A22機車*貨車"
-            elif "自撞" in data:
-                data = "'車禍D6機車騎士*撞靜態物體'"
-            elif data.count("機車") == 2:
-                data = "車禍A20機車"
-        elif "自行車" in data or "腳踏車" in data:
-            if "小客" in data or "汽車" in data:
-                data = "車禍C2腳踏車騎士*汽車"
-            elif "機車" in data:
-                data = "車禍C1腳踏車騎士*機車"
-            elif "摩托車" in data:
-                data = "車禍C1腳踏車騎士*機車"
-            elif "貨車" in data:
-                data = "車禍C3腳踏車騎士*小貨車"
+        # The trie, the synonyms and the extract results memoized from them are replaced together
+        # by a single assignment, so that an extract always sees one version of the dictionary
+        cache = LRUCache(cache_size) if cache_size != 0 else None
+        self._dictionary = (icd.trie, icd.synonyms, cache)
+        # Edits copy the current dictionary, so concurrent edits have to wait for each other
+        self._lock = threading.Lock()
+
+    @property
+    def trie(self) -> Trie:
+        return self._dictionary[0]
+
+    @property
+    def synonyms(self) -> Synonym:
+        return self._dictionary[1]
+
+    @property
+    def cache(self) -> LRUCache:
+        return self._dictionary[2]
+
+    def update_dictionary(
+        self,
+        added_terms: Iterable[str] = (),
+        removed_terms: Iterable[str] = (),
+        added_synonyms: dict = None,
+        removed_synonyms: Iterable[str] = (),
+    ) -> None:
+        """Add and remove diagnoses and synonyms without rebuilding the dictionary.
+
+        The edits are applied to copies of the trie and the synonyms, which then replace the
+        current ones in a single swap, so a concurrent extract sees either all of the edits or
+        none of them. Copying costs one pass over the arrays of the trie, so edits which belong
+        together are best applied in one call.
+        """
+        added_terms, removed_terms = list(added_terms), list(removed_terms)
+        removed_synonyms = list(removed_synonyms)
+        with self._lock:
+            trie, synonyms, cache = self._dictionary
+            if added_terms or removed_terms:
+                trie = trie.copy()
+                for term in added_terms:
+                    trie.add(term)
+                for term in removed_terms:
+                    trie.discard(term)
+            if added_synonyms or removed_synonyms:
+                synonyms = synonyms.copy()
+                synonyms.update(added_synonyms or {})
+                for diagnosis in removed_synonyms:
+                    synonyms.pop(diagnosis, None)
+            self._swap(trie, synonyms)
+
+    def add_terms(self, terms: Iterable[str]) -> None:
+        """Add diagnoses to the dictionary without rebuilding it"""
+        self.update_dictionary(added_terms=terms)
+
+    def remove_terms(self, terms: Iterable[str]) -> None:
+        """Remove diagnoses from the dictionary without rebuilding it"""
+        self.update_dictionary(removed_terms=terms)
+
+    def update_synonyms(self, added: dict = None, removed: Iterable[str] = ()) -> None:
+        """Add diagnoses with their ICD code to and remove diagnoses from the synonyms"""
+        self.update_dictionary(added_synonyms=added, removed_synonyms=removed)
+
+    def _swap(self, trie: Trie, synonyms: Synonym) -> None:
+        """Replace the dictionary, together with the extract results memoized from the old one.
+
+        Callers hold the lock, so that no edit is based on a dictionary which is being replaced.
+        """
+        cache = self.cache
+        if cache is not None:
+            cache = LRUCache(cache.maxsize)
+        self._dictionary = (trie, synonyms, cache)
 
-        return data
+    def _pre_process(self, data: str) -> str:
+        return self.normalizer(data)
 
-    def _post_process(self, data: list, after_11206=False) -> list:
+    def _post_process(self, data: list, after_11206=False, synonyms: Synonym = None) -> list:
+        if synonyms is None:
+            synonyms = self.synonyms
         if len(data) > 1:
             if "性病" in data:
                 data.remove("性病")
@@ -220,48 +161,71 @@ class Tokenizer:
             else:
                 result.append(d)
 
-        has_covid = False
-        for r in result:
-            if r in self.synonyms and self.synonyms[r] == "J128":
-                has_covid = True
-                break
-        if has_covid:
+        if synonyms.has_code(result, "J128"):
             if "感染" in result:
                 result.remove("感染")
 
         return result
 
-    def _is_subset(self, str1: str, str2: str) -> bool:
-        if str1 == str2:
-            return False
-        for i in str1:
-            if i not in str2:
-                return False
-        return True
-
     def remove_synonyms(self, data: list) -> list:
-        result = []
-        for d in data:
-            if d in self.synonyms:
-                contain = False
-                for r in result:
-                    if r in self.synonyms and self.synonyms[d] == self.synonyms[r]:
-                        contain = True
-                        break
-                if not contain:
-                    result.append(d)
-            else:
-                result.append(d)
-        return result
+        return self.synonyms.unique(data)
 
     def remove_subset(self, data: list) -> list:
-        return [e for e in data if not any([self._is_subset(e, r) for r in data])]
+        """Remove tokens whose characters are all contained in another distinct token"""
+        if len(data) < 2:
+            return list(data)
+        charsets = {e: frozenset(e) for e in data}
+        if len(charsets) <= 3:
+            return [
+                e for e in data if not any(charsets[e] <= charsets[r] for r in charsets if r != e)
+            ]
+
+        # Distinct tokens sharing a character set contain each other
+        counts = {}
+        for charset in charsets.values():
+            counts[charset] = counts.get(charset, 0) + 1
+
+        # A character set is kept only if no other set strictly contains it, which is the case
+        # exactly when it is maximal. Checking against the maximal sets found so far in
+        # descending size is enough, as any superset is contained in a maximal one.
+        maximal = []
+        for charset in sorted(counts, key=len, reverse=True):
+            if not any(charset < m for m in maximal):
+                maximal.append(charset)
+        keep = {charset for charset in maximal if counts[charset] == 1}
+        return [e for e in data if charsets[e] in keep]
 
     def remove_duplicate(self, data: list) -> list:
         return list(dict.fromkeys(data))
 
     def extract_icd(self, inputs: Data, after_11206=False):
-        # Shift inputs if there is empty input
+        # Keep using one version of the dictionary for every cell if it is replaced meanwhile
+        dictionary = self._dictionary
+        self._shift(inputs)
+        extract = partial(self.extract, dictionary=dictionary)
+        return self._collect(inputs, extract, dictionary[1], after_11206)
+
+    def extract_icd_batch(self, inputs_list: list[Data], after_11206=False) -> list[Data]:
+        """Tokenize a batch of inputs, extracting each distinct cell only once"""
+        dictionary = self._dictionary
+        cells = {"": []}
+        for inputs in inputs_list:
+            self._shift(inputs)
+            for catalog in Data.KEYS:
+                for cell in inputs[catalog]:
+                    if cell not in cells:
+                        cells[cell] = None
+        for cell, tokens in cells.items():
+            if tokens is None:
+                cells[cell] = self.extract(cell, dictionary)
+
+        return [
+            self._collect(inputs, cells.__getitem__, dictionary[1], after_11206)
+            for inputs in inputs_list
+        ]
+
+    def _shift(self, inputs: Data) -> None:
+        """Shift inputs in place if there is empty input"""
         inputs_list = []
         for catalog in ["甲", "乙", "丙", "丁"]:
             if any(i != "" for i in inputs[catalog]):
@@ -297,13 +261,15 @@ class Tokenizer:
         for i, catalog in enumerate(["甲", "乙", "丙", "丁"]):
             inputs[catalog] = inputs_list[i]
 
+    def _collect(self, inputs: Data, extract, synonyms: Synonym, after_11206=False) -> Data:
+        """Gather tokens of each catalog from the extract results of its cells"""
         data = Data()
         for catalog in Data.KEYS:
             result = []
             for i in range(4):
-                result.extend(self.extract(inputs[catalog][i]))
+                result.extend(extract(inputs[catalog][i]))
 
-            result = self._post_process(result, after_11206)
+            result = self._post_process(result, after_11206, synonyms)
 
             # Extend array length to 4
             while len(result) < 4:
@@ -315,40 +281,57 @@ class Tokenizer:
             data[catalog] = result
         return data
 
-    def extract(self, input_str: str):
+    def cache_info(self) -> CacheInfo:
+        """Return statistics of the extract cache"""
+        if self.cache is None:
+            return CacheInfo(maxsize=0)
+        return self.cache.info()
+
+    def extract(self, input_str: str, dictionary: tuple = None):
+        """Return the diagnoses in input_str, looked up in dictionary or the current one"""
         if input_str == "":
             return []
+        # Keep using one version of the dictionary if it is replaced meanwhile
+        trie, synonyms, cache = dictionary or self._dictionary
+        if cache is None:
+            return self._extract(input_str, trie, synonyms)
+
+        result = cache.get(input_str)
+        if result is None:
+            result = tuple(self._extract(input_str, trie, synonyms))
+            cache.put(input_str, result)
+        return list(result)
+
+    def _extract(self, input_str: str, trie: Trie, synonyms: Synonym):
         input_str = self._pre_process(input_str)
-        if self.trie.has_key(input_str):
+        if trie.has_key(input_str):
             return [input_str]
 
         result = []
         while input_str != "":
-            prefix = self.trie.longest_prefix(input_str).key
+            prefix = trie.longest_prefix(input_str)
             if prefix is None:
-                if self.trie.has_subtrie(input_str[0]):
-                    possibles = [input_str[0]]
-                    for ch in input_str[1:]:
-                        currents = []
-                        for poss in possibles:
-                            if self.trie.has_node(poss + ch) != 0:
-                                currents.append(poss + ch)
-                        possibles.extend(currents)
-                    possibles = [e for e in possibles if self.trie.has_key(e)]
-                    result.extend(possibles)
+                if trie.has_subtrie(input_str[0]):
+                    result.extend(trie.subsequence_keys(input_str))
                 input_str = input_str[1:]
             else:
                 input_str = input_str.removeprefix(prefix)
                 result.append(prefix)
 
         result = self.remove_subset(result)
-        result = self.remove_synonyms(result)
+        result = synonyms.unique(result)
         result = self.remove_duplicate(result)
 
         return result
 
 
 if __name__ == "__main__":
+    import ast
+
+    import pandas as pd
+    from rich.console import Console
+    from rich.table import Table
+
     icd = ICD()
     tokenizer = Tokenizer(icd=icd, experimental=True)
     validator = Validator(icd=icd)
@@ -0,0 +1,344 @@
+import sys
+from array import array
+from collections import Counter
+from typing import Iterable, Optional
+
+
+class Trie:
+    """Double-array trie of diagnosis strings.
+
+    Every node is an index into the flat ``base`` and ``check`` arrays. The child of node ``s``
+    by character ``c`` is ``t = base[s] + code[c]``, which exists only if ``check[t] == s``.
+    Characters are coded by frequency, so that common characters get small codes and the
+    arrays stay dense. ``used`` flags the occupied slots and ``head`` is the first free one,
+    from which edits search for free slots.
+    """
+
+    HAS_VALUE = 1
+    HAS_SUBTRIE = 2
+
+    ROOT = 0
+    WINDOW = 4096
+    PROBES = 2
+
+    def __init__(self, keys: Iterable[str] = ()) -> None:
+        keys = sorted(set(keys))
+
+        # Assign character codes by frequency, code 0 is reserved
+        counter = Counter(ch for key in keys for ch in key)
+        self.codes = {ch: i + 1 for i, (ch, _) in enumerate(counter.most_common())}
+
+        base = [0]
+        check = [-1]
+        value = [0]
+        used = bytearray(b"\x01")  # used[t] is set when slot t is occupied
+        size = len(keys)
+
+        # Depth first construction over ranges of sorted keys: (node, lo, hi, depth)
+        stack = [(self.ROOT, 0, size, 0)]
+        head = 1  # first free slot
+        while stack:
+            node, lo, hi, depth = stack.pop()
+            if lo < hi and len(keys[lo]) == depth:
+                value[node] = 1
+                lo += 1
+            if lo == hi:
+                continue
+
+            # Group keys by the character at depth
+            labels = []
+            ranges = []
+            start = lo
+            for i in range(lo + 1, hi + 1):
+                if i == hi or keys[i][depth] != keys[start][depth]:
+                    labels.append(self.codes[keys[start][depth]])
+                    ranges.append((start, i))
+                    start = i
+
+            # Find a base where every child slot is free. A single child takes the first free
+            # slot, while nodes with more children only probe the tail of the arrays, as the
+            # head is almost full and probing its holes would dominate the build time.
+            first, last = min(labels), max(labels)
+            if len(labels) == 1:
+                pos = max(first + 1, head)
+            else:
+                pos = max(first + 1, len(used) - self.WINDOW)
+            while True:
+                found = used.find(0, pos)
+                pos = found if found >= 0 else max(pos, len(used))
+                b = pos - first
+                if b + last >= len(used):
+                    grow = b + last + 1 - len(used)
+                    used.extend(bytes(grow))
+                    base.extend([0] * grow)
+                    check.extend([-1] * grow)
+                    value.extend([0] * grow)
+                if all(not used[b + c] for c in labels):
+                    break
+                pos += 1
+            if pos == head:
+                head = used.find(0, head + 1)
+                if head < 0:
+                    head = len(used)
+
+            base[node] = b
+            for c in labels:
+                used[b + c] = 1
+                check[b + c] = node
+
+            for c, (start, stop) in zip(reversed(labels), reversed(ranges)):
+                stack.append((b + c, start, stop, depth + 1))
+
+        self.base = array("i", base)
+        self.check = array("i", check)
+        self.value = array("b", value)
+        self.used = used
+        self.head = head
+        self.size = size
+
+    def __len__(self) -> int:
+        return self.size
+
+    def copy(self) -> "Trie":
+        """Return a copy which can be edited without affecting readers of this trie"""
+        trie = Trie.__new__(Trie)
+        trie.codes = dict(self.codes)
+        trie.base = array("i", self.base)
+        trie.check = array("i", self.check)
+        trie.value = array("b", self.value)
+        trie.used = bytearray(self.used)
+        trie.head = self.head
+        trie.size = self.size
+        return trie
+
+    def add(self, key: str) -> bool:
+        """Insert key in place, return False if it is already stored.
+
+        Each character costs one transition. Only when the slot of a new child is taken, the
+        children of either its parent or the owner of the slot, whichever has fewer, are moved
+        to a free base.
+        """
+        node = self.ROOT
+        for ch in key:
+            code = self.codes.get(ch)
+            if code is None:
+                code = self.codes[ch] = len(self.codes) + 1
+            if self.base[node] == 0:
+                self.base[node] = self._find_base([code])
+            child = self.base[node] + code
+            self._grow(child + 1)
+            if self.check[child] != node:
+                if self.used[child]:
+                    # Move whichever of node and the owner of the slot has fewer children
+                    owner = self.check[child]
+                    children = self._children(node)
+                    owned = self._children(owner)
+                    if len(owned) <= len(children):
+                        moved = self.check[node] == owner
+                        offset = node - self.base[owner]
+                        self._relocate(owner, owned)
+                        if moved:
+                            node = self.base[owner] + offset
+                    else:
+                        self._relocate(node, children + [code])
+                    child = self.base[node] + code
+                self._occupy(child, node)
+            node = child
+
+        if self.value[node]:
+            return False
+        self.value[node] = 1
+        self.size += 1
+        return True
+
+    def discard(self, key: str) -> bool:
+        """Remove key in place, return False if it is not stored.
+
+        Nodes which no longer lead to any key are released, so that has_subtrie stays exact.
+        """
+        node = self._walk(key)
+        if node < 0 or not self.value[node]:
+            return False
+        self.value[node] = 0
+        self.size -= 1
+
+        while node != self.ROOT and not self.value[node] and not self._has_children(node):
+            parent = self.check[node]
+            self._release(node)
+            if not self._children(parent):
+                self.base[parent] = 0
+            node = parent
+        return True
+
+    def _children(self, node: int) -> list[int]:
+        """Return codes of the children of node"""
+        b = self.base[node]
+        if b == 0:
+            return []
+        # Search the slots of the alphabet for node as raw bytes, which runs in C
+        size = self.check.itemsize
+        data = self.check[b + 1 : b + len(self.codes) + 1].tobytes()
+        pattern = node.to_bytes(size, sys.byteorder, signed=True)
+        children = []
+        i = data.find(pattern)
+        while i >= 0:
+            if i % size == 0:
+                children.append(i // size + 1)
+            i = data.find(pattern, i + 1)
+        return children
+
+    def _grow(self, size: int) -> None:
+        """Extend the arrays with free slots up to size"""
+        grow = size - len(self.check)
+        if grow > 0:
+            self.base.extend([0] * grow)
+            self.check.extend([-1] * grow)
+            self.value.extend([0] * grow)
+            self.used.extend(bytes(grow))
+
+    def _occupy(self, slot: int, node: int) -> None:
+        """Take a free slot for a new child of node"""
+        self.base[slot] = 0
+        self.check[slot] = node
+        self.value[slot] = 0
+        self.used[slot] = 1
+        if slot == self.head:
+            head = self.used.find(0, slot + 1)
+            self.head = head if head >= 0 else len(self.used)
+
+    def _release(self, slot: int) -> None:
+        """Free a slot, so that a later insert can reuse it"""
+        self.base[slot] = 0
+        self.check[slot] = -1
+        self.value[slot] = 0
+        self.used[slot] = 0
+        self.head = min(self.head, slot)
+
+    def _find_base(self, labels: list[int]) -> int:
+        """Return a base where the slot of every label is free.
+
+        Bases are searched from the first free slot, so that slots released by discard and
+        relocation are reused. The used flags of the slots of each label are OR-ed together as
+        big integers, WINDOW bases at a time, so a free base is a zero byte of the result. Like
+        in the build, children which do not fit the first PROBES windows go to the tail.
+        """
+        used = self.used
+        first = min(labels)
+        pos = used.find(0, max(first + 1, self.head))
+        lo = (pos if pos >= 0 else max(first + 1, len(used))) - first
+        if len(labels) == 1:
+            return lo
+
+        windows = 0
+        while lo + first < len(used):
+            mask = 0
+            for c in labels:
+                start, stop = lo + c, lo + c + self.WINDOW
+                mask |= int.from_bytes(used[start:stop], "big") << 8 * max(0, stop - len(used))
+            i = mask.to_bytes(self.WINDOW, "big").find(0)
+            if i >= 0:
+                return lo + i
+            lo += self.WINDOW
+            windows += 1
+            if windows == self.PROBES:
+                lo = max(lo, len(used) - first - self.WINDOW)
+        return lo
+
+    def _relocate(self, node: int, labels: list[int]) -> None:
+        """Move the children of node to a base where all of labels fit"""
+        b = self._find_base(labels)
+        self._grow(b + max(labels) + 1)
+        old = self.base[node]
+        for code in self._children(node):
+            source, target = old + code, b + code
+            self._occupy(target, node)
+            self.base[target] = self.base[source]
+            self.value[target] = self.value[source]
+            for grandchild in self._children(source):
+                self.check[self.base[source] + grandchild] = target
+            self._release(source)
+        self.base[node] = b
+
+    def __contains__(self, key: str) -> bool:
+        return self.has_key(key)
+
+    def _walk(self, key: str) -> int:
+        """Return the node of key, or -1 if key is not a prefix of any stored key"""
+        base, check, codes = self.base, self.check, self.codes
+        node = self.ROOT
+        for ch in key:
+            code = codes.get(ch)
+            if code is None:
+                return -1
+            child = base[node] + code
+            if child >= len(check) or check[child] != node:
+                return -1
+            node = child
+        return node
+
+    def _has_children(self, node: int) -> bool:
+        return self.base[node] != 0
+
+    def has_key(self, key: str) -> bool:
+        """Return True if key is stored in the trie"""
+        node = self._walk(key)
+        return node >= 0 and self.value[node] == 1
+
+    def has_node(self, key: str) -> int:
+        """Return HAS_VALUE and HAS_SUBTRIE flags of key, 0 if key is not in the trie"""
+        node = self._walk(key)
+        if node < 0:
+            return 0
+        flags = 0
+        if self.value[node]:
+            flags |= self.HAS_VALUE
+        if self._has_children(node):
+            flags |= self.HAS_SUBTRIE
+        return flags
+
+    def has_subtrie(self, key: str) -> bool:
+        """Return True if any stored key starts with key and is longer than key"""
+        node = self._walk(key)
+        return node >= 0 and self._has_children(node)
+
+    def longest_prefix(self, key: str) -> Optional[str]:
+        """Return the longest stored key which is a prefix of key, None if there is none"""
+        base, check, value, codes = self.base, self.check, self.value, self.codes
+        node = self.ROOT
+        length = 0
+        for i, ch in enumerate(key):
+            code = codes.get(ch)
+            if code is None:
+                break
+            child = base[node] + code
+            if child >= len(check) or check[child] != node:
+                break
+            node = child
+            if value[node]:
+                length = i + 1
+        if length == 0:
+            return None
+        return key[:length]
+
+    def subsequence_keys(self, key: str) -> list[str]:
+        """Return stored keys which start with key[0] and are subsequences of key.
+
+        Keys are returned in the order they are completed while scanning key. The frontier holds
+        each trie node at most once, so every character costs one transition per distinct
+        candidate instead of one per way of reaching it.
+        """
+        base, check, value, codes = self.base, self.check, self.value, self.codes
+        node = self._walk(key[:1])
+        if node <= self.ROOT:
+            return []
+
+        frontier = {node: key[0]}
+        for ch in key[1:]:
+            code = codes.get(ch)
+            if code is None:
+                continue
+            for node, prefix in list(frontier.items()):
+                child = base[node] + code
+                if child < len(check) and check[child] == node and child not in frontier:
+                    frontier[child] = prefix + ch
+        return [prefix for node, prefix in frontier.items() if value[node]]
@@ -1,13 +1,47 @@
+import threading
+from typing import Iterable
+
+from icd_tokenize.cache import LRUCache
 from icd_tokenize.data import Data
 from icd_tokenize.icd import ICD
 from icd_tokenize.status import Status
+from icd_tokenize.synonym import Synonym
 
 
 class Validator:
+    # Suffixes which do not change the meaning of a diagnosis, "末期" is also accepted as prefix
+    SUFFIXES = ["死亡", "復發", "疾病", "術後", "末期", "病史"]
+
     def __init__(self, icd: ICD = None) -> None:
         if icd is None:
             icd = ICD()
-        self.synonyms = icd.synonyms
+        self.combinations = icd.combinations
+        # The synonyms and the keys derived from them are replaced by a single assignment
+        self._dictionary = (icd.synonyms, LRUCache(65536))
+        # Edits copy the current synonyms, so concurrent edits have to wait for each other
+        self._lock = threading.Lock()
+
+    @property
+    def synonyms(self) -> Synonym:
+        return self._dictionary[0]
+
+    @property
+    def keys(self) -> LRUCache:
+        return self._dictionary[1]
+
+    def update_synonyms(self, added: dict = None, removed: Iterable[str] = ()) -> None:
+        """Add diagnoses with their ICD code to and remove diagnoses from the synonyms.
+
+        The edits are applied to a copy which then replaces the current synonyms, together with
+        the keys derived from them, so a concurrent validate sees one version of them.
+        """
+        with self._lock:
+            synonyms, keys = self._dictionary
+            synonyms = synonyms.copy()
+            synonyms.update(added or {})
+            for diagnosis in removed:
+                synonyms.pop(diagnosis, None)
+            self._dictionary = (synonyms, LRUCache(keys.maxsize))
 
     def identical_icd(self, predicts: Data, targets: Data) -> Status:
         data = Status()
@@ -22,84 +56,61 @@ class Validator:
         return data
 
     def validate(self, predict: list, target: list) -> bool:
-        combine_list = [
-            ["高血壓", "心臟病", "高血壓心臟病"],
-            ["高血壓病史", "心臟病", "高血壓心臟病"],
-            ["高血壓", "心血管疾病", "高血壓心血管疾病"],
-            ["高血壓", "心臟血管疾病", "高血壓心臟血管疾病"],
-            ["高血壓心臟病", "衰竭", "高血壓心臟病衰竭"],
-            ["高血壓心臟病", "心衰竭", "高血壓心臟病衰竭"],
-            ["高血壓心臟病", "心臟衰竭", "高血壓心臟病衰竭"],
-            ["糖尿病", "腎臟病", "糖尿病腎臟病"],
-            ["糖尿病", "腎衰竭", "糖尿病腎衰竭"],
-            ["糖尿病", "慢性腎病變", "糖尿病慢性腎病變"],
-            ["糖尿病", "末期腎病", "糖尿病末期腎病變"],
-            ["糖尿病", "末期腎病變", "糖尿病末期腎病變"],
-            ["糖尿病", "慢性腎衰竭", "糖尿病慢性腎衰竭"],
-            ["糖尿病", "慢性腎疾病", "糖尿病慢性腎病變"],
-            ["糖尿病", "尿毒症", "糖尿病尿毒症"],
-            ["高血壓", "缺血性心臟病", "高血壓缺血性心臟病"],
-            ["高血壓", "心臟衰竭", "高血壓心臟衰竭"],
-            ["高血壓心臟病", "心臟衰竭", "高血壓心臟病衰竭"],
-            ["心肺衰竭", "腎衰竭", "心肺腎衰竭"],
-            ["敗血症", "休克", "敗血症休克"],
-            ["乳癌", "轉移", "乳癌轉移"],
-            ["大腸癌", "轉移", "大腸癌轉移"],
-            ["癌症末期", "惡病質", "癌症末期惡病質"],
-            ["胰臟癌", "多處轉移", "胰臟癌多處轉移"],
-        ]
-        for pred in predict:
-            if not any([self._icd_compare(pred, tar) for tar in target]):
-                special_case = False
-                for c in combine_list:
-                    if pred == c[0] and c[1] in predict and c[2] in target:
-                        special_case = True
-                        break
-                    elif c[0] in predict and pred == c[1] and c[2] in target:
-                        special_case = True
-                        break
-                    elif pred == c[2] and c[0] in target and c[1] in target:
-                        special_case = True
-                        break
-                if not special_case:
+        predict_set, target_set = set(predict), set(target)
+        if predict_set == target_set:
+            return True
+
+        dictionary = self._dictionary  # keep using one version if it is replaced meanwhile
+        predict_keys = [self._key(pred, *dictionary) for pred in predict]
+        target_keys = [self._key(tar, *dictionary) for tar in target]
+        predict_index = self._index(predict_keys)
+        target_index = self._index(target_keys)
+
+        for pred, key in zip(predict, predict_keys):
+            if not self._match(key, *target_index):
+                if not self.combinations.match(pred, predict_set, target_set):
                     return False
-        for tar in target:
-            if not any([self._icd_compare(pred, tar) for pred in predict]):
-                special_case = False
-                for c in combine_list:
-                    if tar == c[0] and c[1] in target and c[2] in predict:
-                        special_case = True
-                        break
-                    elif c[0] in target and tar == c[1] and c[2] in predict:
-                        special_case = True
-                        break
-                    elif tar == c[2] and c[0] in predict and c[1] in predict:
-                        special_case = True
-                        break
-                if not special_case:
+        for tar, key in zip(target, target_keys):
+            if not self._match(key, *predict_index):
+                if not self.combinations.match(tar, target_set, predict_set):
                     return False
         return True
 
-    def _icd_compare(self, str1: str, str2: str) -> bool:
-        str1, str2 = str1.upper(), str2.upper()
-        if str1 == str2:
-            return True
-        if str1 in self.synonyms and str2 in self.synonyms:
-            return self.synonyms[str1] == self.synonyms[str2]
-        if str1 + "死亡" == str2 or str1 == str2 + "死亡":
-            return True
-        if str1 + "復發" == str2 or str1 == str2 + "復發":
-            return True
-        if str1 + "疾病" == str2 or str1 == str2 + "疾病":
-            return True
-        if str1 + "術後" == str2 or str1 == str2 + "術後":
-            return True
-        if str1 + "末期" == str2 or str1 == str2 + "末期":
-            return True
-        if "末期" + str1 == str2 or str1 == "末期" + str2:
+    def _key(self, diagnosis: str, synonyms: Synonym, keys: LRUCache) -> tuple:
+        """Return (upper-cased diagnosis, synonym ICD code, affix variants) of diagnosis"""
+        key = keys.get(diagnosis)
+        if key is None:
+            upper = diagnosis.upper()
+            variants = {"末期" + upper}
+            if upper.startswith("末期"):
+                variants.add(upper[2:])
+            for suffix in self.SUFFIXES:
+                variants.add(upper + suffix)
+                if upper.endswith(suffix):
+                    variants.add(upper[: -len(suffix)])
+            key = (upper, synonyms.get(upper), frozenset(variants))
+            keys.put(diagnosis, key)
+        return key
+
+    def _index(self, keys: list[tuple]) -> tuple[dict, set]:
+        """Return the synonym ICD code of each upper-cased diagnosis and the set of codes"""
+        codes = {upper: code for upper, code, _ in keys}
+        return codes, {code for code in codes.values() if code is not None}
+
+    def _match(self, key: tuple, codes: dict, code_set: set) -> bool:
+        """Return True if the diagnosis of key is equivalent to any indexed diagnosis.
+
+        Two diagnoses are equivalent if they are equal, if both are synonyms of the same ICD
+        code, or if they only differ by an affix and are not both synonyms.
+        """
+        upper, code, variants = key
+        if upper in codes:
             return True
-        if str1 + "病史" == str2 or str1 == str2 + "病史":
+        if code is not None and code in code_set:
             return True
+        for variant in variants:
+            if variant in codes and (code is None or codes[variant] is None):
+                return True
         return False
 
 
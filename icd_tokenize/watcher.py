@@ -0,0 +1,110 @@
+import csv
+import os
+import threading
+
+from icd_tokenize.synonym import Synonym
+from icd_tokenize.tokenizer import Tokenizer
+from icd_tokenize.validator import Validator
+
+
+class Watcher:
+    """Reload edits of icd.csv and synonym.csv into a live tokenizer and validator.
+
+    Only the diagnoses and synonyms which differ from the last loaded version are applied, so a
+    long-running process picks up edits without rebuilding the dictionary.
+    """
+
+    FILES = ["icd.csv", "synonym.csv"]
+    # Largest share of the diagnoses or synonyms a reload may remove, a larger removal most
+    # likely comes from reading a file which is being written
+    MAX_REMOVED = 0.1
+
+    def __init__(
+        self,
+        tokenizer: Tokenizer = None,
+        validator: Validator = None,
+        dir_path: str = None,
+        interval: float = 1.0,
+    ) -> None:
+        if dir_path is None:
+            dir_path = os.path.join(os.path.dirname(__file__), "data")
+        self.tokenizer = tokenizer
+        self.validator = validator
+        self.dir_path = dir_path
+        self.interval = interval
+
+        self.mtimes = self._mtimes()
+        self.diagnosis = self._diagnosis()
+        self.synonyms = dict(Synonym(dir_path))
+
+        self.rejected = None  # mtimes of the files of a rejected reload
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _mtimes(self) -> list[int]:
+        return [os.stat(os.path.join(self.dir_path, file)).st_mtime_ns for file in self.FILES]
+
+    def _diagnosis(self) -> set[str]:
+        with open(os.path.join(self.dir_path, "icd.csv"), newline="", encoding="utf-8") as f:
+            return {row["diagnosis"] for row in csv.DictReader(f)}
+
+    def check(self, force: bool = False) -> bool:
+        """Apply the diff if a dictionary file changed, return True if it was applied.
+
+        A reload which would remove more than MAX_REMOVED of the diagnoses or synonyms is
+        skipped until the files change again, unless force.
+        """
+        mtimes = self._mtimes()
+        if mtimes == self.mtimes or (mtimes == self.rejected and not force):
+            return False
+        diagnosis = self._diagnosis()
+        synonyms = dict(Synonym(self.dir_path))
+        if self._mtimes() != mtimes:
+            # A file was written while it was read, it is read again on the next check
+            return False
+
+        # Diff of diagnoses and synonyms, a changed ICD code is added again with the new code
+        added = sorted(diagnosis - self.diagnosis)
+        removed = sorted(self.diagnosis - diagnosis)
+        synonyms_added = {k: v for k, v in synonyms.items() if self.synonyms.get(k) != v}
+        synonyms_removed = [k for k in self.synonyms if k not in synonyms]
+        if not force and (
+            len(removed) > self.MAX_REMOVED * len(self.diagnosis)
+            or len(synonyms_removed) > self.MAX_REMOVED * len(self.synonyms)
+        ):
+            self.rejected = mtimes
+            return False
+
+        # Each of them is updated in a single swap
+        if self.tokenizer is not None and (added or removed or synonyms_added or synonyms_removed):
+            self.tokenizer.update_dictionary(added, removed, synonyms_added, synonyms_removed)
+        if self.validator is not None and (synonyms_added or synonyms_removed):
+            self.validator.update_synonyms(synonyms_added, synonyms_removed)
+
+        self.mtimes, self.diagnosis, self.synonyms = mtimes, diagnosis, synonyms
+        self.rejected = None
+        return True
+
+    def start(self) -> None:
+        """Check the dictionary files every interval seconds in a background thread"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background thread"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except (OSError, KeyError, csv.Error):
+                # A file which is being written is read again on the next check
+                continue
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import unicodedata
+from typing import Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# Bump when the content or layout of the cache changes
+CACHE_VERSION = 2
+CACHE_DIR = os.path.join(".cache", "workbooks")
+METADATA_KEY = b"icd_tokenize"
+# Rows per row group, which bounds the memory of reading the cache in batches
+ROW_GROUP_SIZE = 4096
+
+INPUT_COLUMNS = slice(1, 21)  # 甲, 甲2, ..., 其他3, 其他4
+TARGET_COLUMNS = slice(23, 43)  # 甲.1, 甲2.1, ..., 其他3.1, 其他4.1
+
+
+class Workbook:
+    """Monthly 斷字比對 workbook backed by a columnar Parquet cache.
+
+    The first read parses the Excel file, normalizes the input and target columns with NFKC and
+    writes the sheet into the cache. Later reads load the cache until the workbook changes.
+    """
+
+    def __init__(self, path: str, cache_dir: str = None) -> None:
+        if cache_dir is None:
+            cache_dir = CACHE_DIR
+        self.path = path
+        name = os.path.splitext(os.path.basename(path))[0]
+        self.cache_file = os.path.join(cache_dir, f"{name}.parquet")
+
+    def __len__(self) -> int:
+        self.update()
+        return pq.ParquetFile(self.cache_file).metadata.num_rows
+
+    def update(self) -> bool:
+        """Rebuild the cache if the workbook changed, return True if it was rebuilt"""
+        stat = os.stat(self.path)
+        source = {"version": CACHE_VERSION, "mtime": stat.st_mtime_ns, "size": stat.st_size}
+
+        if os.path.exists(self.cache_file):
+            metadata = pq.read_schema(self.cache_file).metadata or {}
+            cached = json.loads(metadata.get(METADATA_KEY, b"{}"))
+            if cached.get("version") == CACHE_VERSION:
+                if cached.get("mtime") == source["mtime"] and cached.get("size") == source["size"]:
+                    return False
+                # The workbook was touched, reuse the cache if the content is the same
+                source["sha256"] = self._hash()
+                if cached.get("sha256") == source["sha256"]:
+                    self._write(pq.read_table(self.cache_file), source)
+                    return False
+
+        df = self._parse()
+        source.setdefault("sha256", self._hash())
+        self._write(pa.Table.from_pandas(df, preserve_index=False), source)
+        return True
+
+    def sha256(self) -> str:
+        """Return the content hash of the workbook, which is kept with the cache"""
+        self.update()
+        metadata = pq.read_schema(self.cache_file).metadata
+        return json.loads(metadata[METADATA_KEY])["sha256"]
+
+    def read(self) -> pd.DataFrame:
+        """Return the sheet with empty strings for missing text and normalized text columns"""
+        self.update()
+        return pq.read_table(self.cache_file).to_pandas()
+
+    def row_groups(self) -> list[int]:
+        """Return the number of rows of each row group in the cache"""
+        self.update()
+        metadata = pq.ParquetFile(self.cache_file).metadata
+        return [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+
+    def targets(self) -> list[str]:
+        """Return sorted unique target diagnoses, except empty ones and ones containing '?'"""
+        self.update()
+        columns = pq.read_schema(self.cache_file).names[TARGET_COLUMNS]
+        table = pq.read_table(self.cache_file, columns=columns)
+        values = pa.chunked_array([chunk for column in table.columns for chunk in column.chunks])
+        values = values.unique()
+        values = values.filter(
+            pc.and_(pc.not_equal(values, ""), pc.invert(pc.match_substring(values, "?")))
+        )
+        return sorted(values.to_pylist())
+
+    def iter_batches(
+        self, batch_size: int = ROW_GROUP_SIZE, row_groups: list[int] = None
+    ) -> Iterator[pd.DataFrame]:
+        """Yield the sheet, or only its row_groups, in chunks of batch_size rows.
+
+        Only one chunk is held in memory at a time.
+        """
+        self.update()
+        parquet_file = pq.ParquetFile(self.cache_file)
+        for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=row_groups):
+            yield batch.to_pandas()
+
+    def _hash(self) -> str:
+        with open(self.path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+
+    def _parse(self) -> pd.DataFrame:
+        df = pd.read_excel(self.path, header=1)
+        for columns in [INPUT_COLUMNS, TARGET_COLUMNS]:
+            for col in df.columns[columns]:
+                df[col] = [
+                    unicodedata.normalize("NFKC", value) if isinstance(value, str) else ""
+                    for value in df[col]
+                ]
+        return df
+
+    def _write(self, table: pa.Table, source: dict) -> None:
+        metadata = dict(table.schema.metadata or {})
+        metadata[METADATA_KEY] = json.dumps(source).encode()
+        table = table.replace_schema_metadata(metadata)
+
+        # Write to a temporary file first, so that readers never see a partial cache
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+        pq.write_table(table, tmp_file, row_group_size=ROW_GROUP_SIZE)
+        os.replace(tmp_file, self.cache_file)
@@ -0,0 +1,176 @@
+import csv
+import json
+from abc import ABC, abstractmethod
+
+from icd_tokenize.data import Data
+from icd_tokenize.record import Record
+
+
+class Writer(ABC):
+    """Write into a file as results are produced, so memory stays bounded"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @abstractmethod
+    def close(self) -> None:
+        """Finish and close the file"""
+
+
+class RecordWriter(Writer):
+    """Write records into a file"""
+
+    @abstractmethod
+    def write(self, records: list[Record]) -> None:
+        """Write records after the ones written before"""
+
+
+class RowWriter(Writer):
+    """Write rows of dicts, such as error rows, into a file"""
+
+    @abstractmethod
+    def write(self, rows: list[dict]) -> None:
+        """Write rows after the ones written before"""
+
+
+class CsvWriter(RowWriter):
+    """Write rows of dicts into a csv file, in the same format as DataFrame.to_csv"""
+
+    def __init__(self, path: str, fieldnames: list[str]) -> None:
+        super().__init__(path)
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames, lineterminator="\n")
+        self.writer.writeheader()
+
+    def write(self, rows: list[dict]) -> None:
+        self.writer.writerows(rows)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class JsonLinesWriter(RowWriter):
+    """Write rows of dicts into a json lines file, one row per line"""
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, rows: list[dict]) -> None:
+        for row in rows:
+            self.file.write(json.dumps(row, ensure_ascii=False))
+            self.file.write("\n")
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class JsonWriter(RecordWriter):
+    """Write Record.for_json of records into a json array one record at a time"""
+
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self.file = open(path, "w", encoding="utf-8")
+        self.file.write("[")
+        self.separator = ""
+
+    def write(self, records: list[Record]) -> None:
+        for record in records:
+            self.file.write(self.separator)
+            self.file.write(json.dumps(record.for_json(), ensure_ascii=False))
+            self.separator = ", "
+
+    def close(self) -> None:
+        self.file.write("]")
+        self.file.close()
+
+
+class ExcelWriter(RecordWriter):
+    """Write Record.for_excel of correct and incorrect records into two sheets.
+
+    The workbook is written in constant memory mode of xlsxwriter, which flushes every row once
+    the next one is started.
+    """
+
+    def __init__(self, path: str, name: str) -> None:
+        import xlsxwriter
+
+        super().__init__(path)
+        self.workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+        self.sheets = {}
+        for correct, suffix in [(True, "斷詞正確"), (False, "斷詞錯誤")]:
+            worksheet = self.workbook.add_worksheet(f"{name}_{suffix}")
+            worksheet.write_row(0, 0, ["s_num", "NO"])
+            worksheet.write_string(0, 2, "斷詞前")
+            worksheet.write_row(0, 3, [f"{key}{tag}" for key in Data.KEYS for tag in Data.TAGS])
+            worksheet.write_string(0, 23, "斷詞後")
+            worksheet.write_row(0, 24, [f"{key}{tag}" for key in Data.KEYS for tag in Data.TAGS])
+            self.sheets[correct] = [worksheet, 1]  # worksheet and its next row
+
+    def write(self, records: list[Record]) -> None:
+        for record in records:
+            sheet = self.sheets[record.is_correct]
+            worksheet, row = sheet
+            index, before, after = record.for_excel()
+            worksheet.write_row(row, 0, list(index.values()))
+            worksheet.write_row(row, 3, list(before.values()))
+            worksheet.write_row(row, 24, list(after.values()))
+            sheet[1] += 1
+
+    def close(self) -> None:
+        self.workbook.close()
+
+
+class ParquetWriter(RecordWriter):
+    """Write one row for each catalog of records into a parquet file for analysis"""
+
+    def __init__(self, path: str) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        super().__init__(path)
+        self.pa = pa
+        self.schema = pa.schema(
+            [
+                ("year", pa.int32()),
+                ("month", pa.int32()),
+                ("serial", pa.int64()),
+                ("number", pa.int64()),
+                ("catalog", pa.string()),
+                ("inputs", pa.list_(pa.string())),
+                ("results", pa.list_(pa.string())),
+                ("targets", pa.list_(pa.string())),
+                ("correct", pa.bool_()),
+                ("identical", pa.bool_()),
+            ]
+        )
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, records: list[Record]) -> None:
+        rows = []
+        for record in records:
+            for catalog in Data.KEYS:
+                rows.append(
+                    {
+                        "year": record.year,
+                        "month": record.month,
+                        "serial": record.serial,
+                        "number": record.number,
+                        "catalog": catalog,
+                        "inputs": list(filter(None, record.inputs[catalog])),
+                        "results": list(filter(None, record.results[catalog])),
+                        "targets": list(filter(None, record.targets[catalog])),
+                        "correct": record.corrects[catalog],
+                        "identical": record.identical[catalog],
+                    }
+                )
+        self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.schema))
+
+    def close(self) -> None:
+        self.writer.close()
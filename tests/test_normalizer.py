@@ -0,0 +1,59 @@
+import random
+import re
+
+import pytest
+
+from icd_tokenize.normalizer import Normalizer
+
+
+def sequential(data: str) -> str:
+    """Apply every pattern one by one with re.sub, as the tokenizer did before Normalizer"""
+    for pattern, repl in Normalizer.CONJUNCTIONS:
+        data = re.sub(pattern, repl, data)
+    for pattern in Normalizer.DELETIONS:
+        data = re.sub(re.escape(pattern), "", data)
+    data = re.sub(r"\s", "", data)
+    for pattern, repl in Normalizer.REWRITES:
+        data = re.sub(re.escape(pattern), repl, data)
+    return Normalizer.EXACT.get(data, data)
+
+
+def fragments() -> list[str]:
+    """Patterns, replacements and their halves, which overlap each other when joined"""
+    texts = Normalizer.DELETIONS + [text for pair in Normalizer.REWRITES for text in pair]
+    pieces = set(texts)
+    for text in texts:
+        for i in range(1, len(text)):
+            pieces.update([text[:i], text[i:]])
+    return sorted(pieces) + ["併", "合併", "併發", "症", " ", "\t", "肺炎", "燒碳", "洗腎"]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_same_as_sequential(seed):
+    rng = random.Random(seed)
+    normalizer = Normalizer()
+    pieces = fragments()
+    for _ in range(20000):
+        data = "".join(rng.choice(pieces) for _ in range(rng.randint(1, 6)))
+        # Pregnancy and traffic rules are shared by both, so they are left out of the inputs
+        if "懷孕" in data or "車" in data:
+            continue
+        assert normalizer(data) == sequential(data), data
+
+
+def test_overlapping_rewrites():
+    normalizer = Normalizer()
+    for data in [
+        "風溼疹",
+        "貳拾壹",
+        "嚴重傳染性肺炎確診",
+        "新冠確診新冠狀病毒感染",
+        "大出血清潔劑",
+    ]:
+        assert normalizer(data) == sequential(data), data
+
+
+def test_deletions_joining_a_match():
+    normalizer = Normalizer()
+    for data in ["未非新冠肺炎明", "無外傷未明性死因", "未 明", "無明顯外及傷"]:
+        assert normalizer(data) == sequential(data), data
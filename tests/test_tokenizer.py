@@ -0,0 +1,48 @@
+import threading
+
+import pytest
+
+from icd_tokenize.data import Data
+from icd_tokenize.icd import ICD
+from icd_tokenize.tokenizer import Tokenizer
+
+
+@pytest.fixture(scope="module")
+def icd():
+    return ICD()
+
+
+def test_concurrent_edits_are_all_kept(icd):
+    tokenizer = Tokenizer(icd)
+    terms = {prefix: [f"{prefix}測試{i}" for i in range(50)] for prefix in "甲乙丙丁"}
+
+    def edit(prefix):
+        for term in terms[prefix]:
+            tokenizer.add_terms([term])
+            tokenizer.update_synonyms({term: "X99"})
+
+    threads = [threading.Thread(target=edit, args=(prefix,)) for prefix in terms]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for term in [term for group in terms.values() for term in group]:
+        assert tokenizer.trie.has_key(term), term
+        assert tokenizer.synonyms.get(term) == "X99", term
+
+
+def test_extract_icd_sees_one_dictionary(icd, monkeypatch):
+    tokenizer = Tokenizer(icd, cache_size=0)
+    tokenizer.add_terms(["測試病"])
+    extract = tokenizer.extract
+
+    def extract_and_edit(input_str, dictionary=None):
+        # A synonym of J128 drops "感染" from the row, if the edit is seen by the row
+        tokenizer.update_synonyms({"測試病": "J128"})
+        return extract(input_str, dictionary)
+
+    monkeypatch.setattr(tokenizer, "extract", extract_and_edit)
+    inputs = Data([["測試病", "感染", "", ""]] + [["", "", "", ""] for _ in range(4)])
+    assert tokenizer.extract_icd(inputs)["甲"] == ["測試病", "感染", "", ""]
+    assert tokenizer.extract_icd(inputs)["甲"] == ["測試病", "", "", ""]
@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+from icd_tokenize.trie import Trie
+
+# A small alphabet, so that keys share prefixes and new children collide with taken slots
+ALPHABET = "甲乙丙丁戊己庚辛壬癸"
+
+
+def random_key(rng: random.Random) -> str:
+    return "".join(rng.choice(ALPHABET) for _ in range(rng.randint(1, 6)))
+
+
+def longest_prefix(keys: set[str], query: str):
+    for i in range(len(query), 0, -1):
+        if query[:i] in keys:
+            return query[:i]
+    return None
+
+
+def assert_matches(trie: Trie, keys: set[str], queries: list[str]) -> None:
+    assert len(trie) == len(keys)
+    for query in queries:
+        assert trie.has_key(query) == (query in keys), query
+        assert trie.has_subtrie(query) == any(
+            len(key) > len(query) and key.startswith(query) for key in keys
+        ), query
+        assert trie.longest_prefix(query) == longest_prefix(keys, query), query
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_add_discard(seed):
+    rng = random.Random(seed)
+    keys = {random_key(rng) for _ in range(200)}
+    trie = Trie(keys)
+
+    for step in range(2000):
+        key = random_key(rng)
+        if rng.random() < 0.5:
+            assert trie.add(key) == (key not in keys)
+            keys.add(key)
+        else:
+            if keys and rng.random() < 0.8:
+                key = rng.choice(sorted(keys))
+            assert trie.discard(key) == (key in keys)
+            keys.discard(key)
+        if step % 500 == 0:
+            assert_matches(trie, keys, [random_key(rng) for _ in range(200)])
+
+    queries = sorted(keys) + [random_key(rng) for _ in range(500)]
+    assert_matches(trie, keys, queries)
+    assert_matches(Trie(keys), keys, queries)
+
+
+def test_add_to_empty():
+    trie = Trie()
+    for key in ["甲乙", "甲", "乙丙丁", "甲乙"]:
+        trie.add(key)
+    assert_matches(trie, {"甲乙", "甲", "乙丙丁"}, ["甲", "甲乙", "甲乙丙", "乙", "乙丙丁", "丙"])
+
+
+def test_copy_is_independent():
+    keys = {"甲乙", "甲乙丙", "丁"}
+    trie = Trie(keys)
+    copy = trie.copy()
+    copy.add("甲戊")
+    copy.add("庚辛")
+    copy.discard("甲乙丙")
+    assert_matches(trie, keys, ["甲乙", "甲乙丙", "丁", "甲戊", "庚辛", "甲"])
+    assert_matches(copy, {"甲乙", "丁", "甲戊", "庚辛"}, ["甲乙", "甲乙丙", "甲戊", "庚辛", "甲"])
+
+
+def test_edits_reuse_freed_slots():
+    # A larger alphabet spreads the children of a node, so relocated nodes leave holes behind
+    rng = random.Random(0)
+    alphabet = [chr(0x4E00 + i) for i in range(300)]
+    keys = {"".join(rng.choices(alphabet, k=rng.randint(1, 6))) for _ in range(3000)}
+    keys = rng.sample(sorted(keys), len(keys))
+
+    trie = Trie(keys[:2000])
+    for key in keys[2000:]:
+        trie.add(key)
+    for key in keys[:1000]:
+        trie.discard(key)
+    for key in keys[:1000]:
+        trie.add(key)
+    assert len(trie.check) <= 1.1 * len(Trie(keys).check)
+    assert_matches(trie, set(keys), keys[:200])
@@ -0,0 +1,129 @@
+import random
+
+import pytest
+
+from icd_tokenize.icd import ICD
+from icd_tokenize.validator import Validator
+
+# Suffixes which _icd_compare accepted, "末期" was also accepted as prefix
+SUFFIXES = ["死亡", "復發", "疾病", "術後", "末期", "病史"]
+
+
+@pytest.fixture(scope="module")
+def validator():
+    return Validator(ICD())
+
+
+def icd_compare(synonyms: dict, str1: str, str2: str) -> bool:
+    """Compare two diagnoses pairwise, as Validator did before cached keys"""
+    str1, str2 = str1.upper(), str2.upper()
+    if str1 == str2:
+        return True
+    if str1 in synonyms and str2 in synonyms:
+        return synonyms[str1] == synonyms[str2]
+    for suffix in SUFFIXES:
+        if str1 + suffix == str2 or str1 == str2 + suffix:
+            return True
+    if "末期" + str1 == str2 or str1 == "末期" + str2:
+        return True
+    return False
+
+
+def pairwise(validator: Validator, predict: list, target: list) -> bool:
+    """Validate by comparing every prediction with every target"""
+    predict_set, target_set = set(predict), set(target)
+    for pred in predict:
+        if not any(icd_compare(validator.synonyms, pred, tar) for tar in target):
+            if not validator.combinations.match(pred, predict_set, target_set):
+                return False
+    for tar in target:
+        if not any(icd_compare(validator.synonyms, pred, tar) for pred in predict):
+            if not validator.combinations.match(tar, target_set, predict_set):
+                return False
+    return True
+
+
+def synonyms_by_code(validator: Validator) -> dict[str, list[str]]:
+    by_code = {}
+    for diagnosis, code in validator.synonyms.items():
+        by_code.setdefault(code, []).append(diagnosis)
+    return by_code
+
+
+def diagnoses(validator: Validator, rng: random.Random) -> list[str]:
+    """Synonyms sharing ICD codes, other diagnoses and components of combinations"""
+    shared = [group for group in synonyms_by_code(validator).values() if len(group) > 1]
+    pool = [d for group in rng.sample(shared, 50) for d in group[:3]]
+    pool += rng.sample(sorted(validator.synonyms), 50)
+    pool += ["自創病名", "covid-19", "Covid-19死亡", "末期自創病名"]
+    for first, rules in validator.combinations.by_first.items():
+        pool += [first] + [d for rule in rules for d in rule]
+    return sorted(set(pool))
+
+
+def variant(diagnosis: str, synonyms: dict, pool: list, rng: random.Random) -> str:
+    """Return diagnosis itself, an affix variant, a synonym or another diagnosis"""
+    choice = rng.randrange(6)
+    if choice == 1:
+        return diagnosis + rng.choice(SUFFIXES)
+    if choice == 2:
+        return "末期" + diagnosis
+    if choice == 3:
+        for affix in SUFFIXES:
+            if diagnosis.endswith(affix):
+                return diagnosis[: -len(affix)]
+        return diagnosis.removeprefix("末期")
+    if choice == 4:
+        return rng.choice(synonyms.get(diagnosis, [diagnosis]))
+    if choice == 5:
+        return rng.choice(pool)
+    return diagnosis
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_same_as_pairwise(validator, seed):
+    rng = random.Random(seed)
+    pool = diagnoses(validator, rng)
+    by_code = synonyms_by_code(validator)
+    synonyms = {d: by_code[validator.synonyms[d]] for d in pool if d in validator.synonyms}
+    rules = [
+        ([first, second], [combined])
+        for first, rules in validator.combinations.by_first.items()
+        for second, combined in rules
+    ]
+    for _ in range(2000):
+        if rng.random() < 0.3:
+            predict, target = rng.choice(rules)
+            if rng.random() < 0.5:
+                predict, target = target, predict
+        else:
+            predict = rng.sample(pool, rng.randint(1, 4))
+            target = list(predict)
+        # Targets are variants of the predictions, so that most of them match
+        target = [variant(d, synonyms, pool, rng) for d in target]
+        if rng.random() < 0.2:
+            target.append(rng.choice(pool + [""]))
+        if len(target) > 1 and rng.random() < 0.2:
+            target.pop(rng.randrange(len(target)))
+        assert validator.validate(predict, target) == pairwise(validator, predict, target), (
+            predict,
+            target,
+        )
+
+
+def test_fixed_cases(validator):
+    for predict, target in [
+        (["高血壓", "心臟病"], ["高血壓心臟病"]),
+        (["高血壓心臟病"], ["高血壓", "心臟病"]),
+        (["高血壓病史", "心臟病"], ["高血壓心臟病"]),
+        (["末期腎臟病"], ["腎臟病"]),
+        (["腎臟病末期"], ["末期腎臟病"]),
+        (["肺炎死亡"], ["肺炎"]),
+        (["肺炎"], ["肺炎復發"]),
+        (["covid-19"], ["COVID-19"]),
+        (["肺炎", ""], ["肺炎"]),
+    ]:
+        assert validator.validate(predict, target) == pairwise(validator, predict, target), (
+            predict,
+            target,
+        )